@@ -0,0 +1,14 @@
+import os
+import sys
+
+# the benchmarks import the application modules the same way the application
+# itself does, so the application directory needs to be importable
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bookstone"
+    ),
+)
+
+# no window will ever be shown
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,64 @@
+# times LibraryIndexingWorker.indexBooks on synthetic trees of growing size
+# every series directory is a candidate itself (standalone pattern) and
+# contains volume candidates (series pattern), so half of all candidates
+# need to be eliminated as nested books
+# run with python -m benchmarks.book_elimination from the repository root
+
+import time
+from typing import List
+
+from PyQt5.QtWidgets import QApplication
+
+from connection_pool import ConnectionPool
+from library.library import Library
+from library.node import Node
+from workers.library_indexing import LibraryIndexingWorker
+
+SIZES: List[int] = [10000, 50000, 100000, 250000, 500000]
+
+
+def buildTree(candidates: int) -> Node:
+
+    tree: Node = Node()
+    series: Node
+    volume: Node
+    i: int = 0
+
+    while i < candidates:
+
+        series = Node(f"Author {i // 100} - Series {i}")
+        tree.addChild(series)
+        i += 1
+
+        volume = Node(f"{i:02d} - Title {i}")
+        series.addChild(volume)
+        i += 1
+
+    return tree
+
+
+def main() -> None:
+
+    app: QApplication = QApplication([])
+    lib: Library = Library()
+    worker: LibraryIndexingWorker = LibraryIndexingWorker(
+        application=app, connection_pool=ConnectionPool(), library=lib
+    )
+    size: int
+
+    print(f"{'candidates':>10} {'books':>8} {'seconds':>8} {'us/candidate':>13}")
+
+    for size in SIZES:
+
+        tree: Node = buildTree(size)
+
+        start: float = time.perf_counter()
+        books: int = len(worker.indexBooks(lib, tree))
+        elapsed: float = time.perf_counter() - start
+
+        print(f"{size:>10} {books:>8} {elapsed:>8.2f} {elapsed / size * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,53 @@
+# measures the per-iteration overhead of the different ways a worker loop
+# can check whether it should stop
+# run with python -m benchmarks.cancellation from the repository root
+
+import time
+from typing import Callable, List, Tuple
+
+from PyQt5.QtCore import QThread
+from PyQt5.QtWidgets import QApplication
+
+from workers.cancellation_token import CancellationToken
+
+ITERATIONS: int = 1000000
+
+
+def measure(check: Callable[[], None]) -> float:
+
+    i: int
+    start: float = time.perf_counter()
+
+    for i in range(ITERATIONS):
+        check()
+
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+def main() -> None:
+
+    app: QApplication = QApplication([])
+    token: CancellationToken = CancellationToken()
+    baseline: float = measure(lambda: None)
+    name: str
+    check: Callable[[], None]
+
+    checks: List[Tuple[str, Callable[[], None]]] = [
+        ("QApplication.processEvents", app.processEvents),  # type: ignore
+        (
+            "QThread.isInterruptionRequested",
+            lambda: QThread.currentThread().isInterruptionRequested(),  # type: ignore
+        ),
+        ("CancellationToken.tick", token.tick),
+        ("CancellationToken.check", token.check),
+    ]
+
+    print(f"{'check':<32} {'ns/iteration':>13}")
+
+    for name, check in checks:
+        print(f"{name:<32} {(measure(check) - baseline) * 1e9:>13.1f}")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,233 @@
+# times the indexing pipeline on synthetic libraries of growing size
+# every stage is run twice, once for the wall time and once with tracemalloc
+# enabled for the peak memory, since tracing slows everything down considerably
+# results are written as JSON, so that they can be compared between releases
+# run with python -m benchmarks.indexing from the repository root
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, cast
+
+from fs.base import FS
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+from PyQt5.QtWidgets import QApplication
+
+from connection_pool import ConnectionPool
+from library.library import Library
+from library.manager import LibraryManager
+from library.node import Node
+from ui.models.grouped_books import GroupedBooksModel
+from workers.library_indexing import LibraryIndexingWorker
+
+from .synthetic_library import SyntheticLibrary, countNodes
+
+BACKENDS: List[str] = ["mem", "osfs"]
+SIZES: List[int] = [1000, 10000, 100000]
+
+T = TypeVar("T")
+
+
+@dataclass
+class BenchmarkResult:
+
+    backend: str
+    books: int
+    stage: str
+    seconds: float
+    peak_memory: int
+    nodes: int
+
+
+def measure(function: Callable[[], T], memory: bool = True) -> Tuple[T, float, int]:
+
+    peak: int = 0
+    result: T
+    start: float = time.perf_counter()
+
+    result = function()
+
+    elapsed: float = time.perf_counter() - start
+
+    if memory:
+
+        tracemalloc.start()
+
+        function()
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return (result, elapsed, peak)
+
+
+# the crawler opens connections to the library path through the connection pool
+# every mem:// url would open a new and empty filesystem though, so the pool
+# is handed the generated one up front and the crawler only ever uses one
+# connection at a time
+
+
+def openBackend(backend: str, pool: ConnectionPool) -> Tuple[FS, str, Optional[str]]:
+
+    directory: str
+    f: FS
+
+    if backend == "mem":
+
+        f = MemoryFS()
+        pool.release("mem://", f)
+
+        return (f, "mem://", None)
+
+    directory = tempfile.mkdtemp(prefix="bookstone-benchmark-")
+    f = OSFS(directory)
+
+    return (f, "osfs://" + directory, directory)
+
+
+def run(
+    app: QApplication,
+    backend: str,
+    books: int,
+    synthetic: SyntheticLibrary,
+    memory: bool,
+) -> List[BenchmarkResult]:
+
+    directory: Optional[str]
+    f: FS
+    manager: LibraryManager
+    pool: ConnectionPool = ConnectionPool()
+    results: List[BenchmarkResult] = []
+    url: str
+
+    f, url, directory = openBackend(backend, pool)
+
+    try:
+
+        synthetic.generate(f, books)
+
+        lib: Library = Library()
+        lib.setPath(url)
+        lib.setGroups(["author", "series"])
+
+        worker: LibraryIndexingWorker = LibraryIndexingWorker(
+            application=app, connection_pool=pool, library=lib
+        )
+
+        def result(stage: str, seconds: float, peak: int, nodes: int) -> None:
+
+            results.append(
+                BenchmarkResult(
+                    backend=backend,
+                    books=books,
+                    stage=stage,
+                    seconds=seconds,
+                    peak_memory=peak,
+                    nodes=nodes,
+                )
+            )
+
+        tree, seconds, peak = measure(lambda: worker.indexFolderStructure(lib), memory)
+
+        assert tree is not None
+
+        nodes: int = countNodes(tree)
+        result("indexFolderStructure", seconds, peak, nodes)
+
+        found, seconds, peak = measure(
+            lambda: worker.indexBooks(lib, cast(Node, tree)), memory
+        )
+
+        assert len(found) == books
+
+        result("indexBooks", seconds, peak, nodes)
+
+        lib.setTree(tree)
+        lib.setBooks(found)
+
+        ser, seconds, peak = measure(lib.serialize, memory)
+        result("Library.serialize", seconds, peak, nodes)
+
+        _, seconds, peak = measure(lambda: Library().deserialize(ser), memory)
+        result("Library.deserialize", seconds, peak, nodes)
+
+        manager = LibraryManager(cast(Any, None), cast(Any, None), cast(Any, None))
+        manager.addLibrary(lib)
+        model: GroupedBooksModel = GroupedBooksModel(manager)
+
+        _, seconds, peak = measure(lambda: model.update(lib), memory)
+        result("GroupedBooksModel.update", seconds, peak, nodes)
+
+    finally:
+
+        pool.close()
+        f.close()
+
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def main() -> None:
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m benchmarks.indexing"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--series-per-author", type=int, default=2)
+    parser.add_argument("--volumes-per-series", type=int, default=5)
+    parser.add_argument("--standalone-per-author", type=int, default=5)
+    parser.add_argument("--files-per-book", type=int, default=3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="don't measure the peak memory"
+    )
+    parser.add_argument("--output", "-o", help="file to write to instead of stdout")
+
+    args: argparse.Namespace = parser.parse_args()
+
+    app: QApplication = QApplication([])
+    backend: str
+    books: int
+    results: List[BenchmarkResult] = []
+    synthetic: SyntheticLibrary = SyntheticLibrary(
+        series_per_author=args.series_per_author,
+        volumes_per_series=args.volumes_per_series,
+        standalone_per_author=args.standalone_per_author,
+        files_per_book=args.files_per_book,
+    )
+
+    for backend in args.backends:
+        for books in args.sizes:
+
+            print(f"{backend}: {books} books", file=sys.stderr)
+
+            results.extend(
+                run(app, backend, books, synthetic, memory=not args.no_memory)
+            )
+
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "library": asdict(synthetic),
+        "results": [asdict(r) for r in results],
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+
+    main()
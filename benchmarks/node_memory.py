@@ -0,0 +1,65 @@
+# measures the memory a library tree needs per node, both as regular nodes
+# and stored as ColumnarTree
+# run with python -m benchmarks.node_memory from the repository root
+
+import gc
+import tracemalloc
+from typing import List
+
+from library.columnar_tree import ColumnarTree
+from library.node import Node
+
+from .synthetic_library import SyntheticLibrary, countNodes
+
+SIZES: List[int] = [10000, 100000]
+
+
+def main() -> None:
+
+    books: int
+    columnar: int
+    nodes: int
+    size: int
+    synthetic: SyntheticLibrary = SyntheticLibrary()
+    tree: Node
+
+    print(
+        f"{'books':>8} {'nodes':>8} {'MiB':>8} {'bytes/node':>11} "
+        f"{'columnar MiB':>13} {'bytes/node':>11}"
+    )
+
+    for books in SIZES:
+
+        gc.collect()
+        tracemalloc.start()
+
+        tree = synthetic.buildTree(books)
+
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        nodes = countNodes(tree)
+
+        # the temporary objects needed while building don't count
+        gc.collect()
+        tracemalloc.start()
+
+        columnar_tree: ColumnarTree = ColumnarTree.fromNode(tree)
+
+        gc.collect()
+        columnar, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{books:>8} {nodes:>8} {size / 1024 / 1024:>8.1f} {size / nodes:>11.1f} "
+            f"{columnar / 1024 / 1024:>13.1f} {columnar / nodes:>11.1f}"
+        )
+
+        del columnar_tree
+        del tree
+
+
+if __name__ == "__main__":
+
+    main()
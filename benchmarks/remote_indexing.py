@@ -0,0 +1,159 @@
+# times indexFolderStructure against a local FTP server with injected latency
+# for several amounts of indexing connections, so that crawler strategies
+# can be compared the way they would behave against a real remote library
+# results are written as JSON, just like benchmarks.indexing
+# run with python -m benchmarks.remote_indexing from the repository root
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from fs.osfs import OSFS
+from PyQt5.QtWidgets import QApplication
+
+from connection_pool import ConnectionPool
+from library.library import Library
+from library.node import Node
+from workers.library_indexing import LibraryIndexingWorker
+
+from .ftp_server import LatencyFTPServer
+from .synthetic_library import SyntheticLibrary, countNodes
+
+BOOKS: int = 1000
+CONNECTIONS: List[int] = [1, 2, 4, 8]
+# per command, in seconds
+LATENCIES: List[float] = [0.0, 0.005, 0.02]
+
+
+@dataclass
+class RemoteBenchmarkResult:
+
+    books: int
+    latency: float
+    bandwidth: int
+    connections: int
+    seconds: float
+    nodes: int
+
+
+def run(
+    app: QApplication,
+    root: str,
+    books: int,
+    latency: float,
+    bandwidth: int,
+    connections: int,
+) -> RemoteBenchmarkResult:
+
+    elapsed: float
+    pool: ConnectionPool = ConnectionPool()
+    start: float
+    tree: Optional[Node]
+
+    with LatencyFTPServer(root, latency=latency, bandwidth=bandwidth) as server:
+
+        lib: Library = Library()
+        lib.setPath(server.getUrl())
+        lib.setIndexingConnections(connections)
+
+        worker: LibraryIndexingWorker = LibraryIndexingWorker(
+            application=app, connection_pool=pool, library=lib
+        )
+
+        try:
+
+            # connecting is part of the measurement, the pool starts empty
+            start = time.perf_counter()
+            tree = worker.indexFolderStructure(lib)
+            elapsed = time.perf_counter() - start
+
+        finally:
+            pool.close()
+
+    assert tree is not None
+
+    return RemoteBenchmarkResult(
+        books=books,
+        latency=latency,
+        bandwidth=bandwidth,
+        connections=connections,
+        seconds=elapsed,
+        nodes=countNodes(tree),
+    )
+
+
+def main() -> None:
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m benchmarks.remote_indexing"
+    )
+    parser.add_argument("--books", type=int, default=BOOKS)
+    parser.add_argument("--connections", type=int, nargs="+", default=CONNECTIONS)
+    parser.add_argument(
+        "--latencies",
+        type=float,
+        nargs="+",
+        default=LATENCIES,
+        help="delay of every FTP command, in seconds",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        default=0,
+        help="maximum transfer rate of every data connection in bytes/s",
+    )
+    parser.add_argument("--files-per-book", type=int, default=3)
+    parser.add_argument("--output", "-o", help="file to write to instead of stdout")
+
+    args: argparse.Namespace = parser.parse_args()
+
+    app: QApplication = QApplication([])
+    connections: int
+    latency: float
+    results: List[RemoteBenchmarkResult] = []
+    root: str = tempfile.mkdtemp(prefix="bookstone-benchmark-")
+    synthetic: SyntheticLibrary = SyntheticLibrary(files_per_book=args.files_per_book)
+
+    try:
+
+        with OSFS(root) as library_fs:
+            synthetic.generate(library_fs, args.books)
+
+        for latency in args.latencies:
+            for connections in args.connections:
+
+                print(
+                    f"{latency * 1000:g} ms latency: {connections} connections",
+                    file=sys.stderr,
+                )
+
+                results.append(
+                    run(app, root, args.books, latency, args.bandwidth, connections)
+                )
+
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "library": asdict(synthetic),
+        "results": [asdict(r) for r in results],
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,150 @@
+# compares the time needed to load several synthetic libraries at startup
+# with their trees being loaded right away and with their trees being
+# loaded lazily, as LibraryManager does, for both library storages
+# tree_seconds is the time needed to load all trees afterwards, which is
+# usually spent by the indexer instead of the main thread
+# results are written as JSON, just like benchmarks.indexing
+# run with python -m benchmarks.startup from the repository root
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List
+
+from library import sqlite_storage
+from library.binary_storage import readLibrary, writeLibrary
+from library.library import Library
+
+from .storage import createLibrary, measure
+from .synthetic_library import SyntheticLibrary
+
+BOOKS: int = 20000
+LIBRARIES: int = 10
+
+
+@dataclass
+class StartupBenchmarkResult:
+
+    libraries: int
+    books: int
+    format: str
+    lazy: bool
+    load_seconds: float
+    tree_seconds: float
+
+
+def loadAll(
+    file_names: List[str], read: Callable[[str], Library], libs: List[Library]
+) -> None:
+
+    file_name: str
+
+    for file_name in file_names:
+        libs.append(read(file_name))
+
+
+def loadTrees(libs: List[Library]) -> None:
+
+    lib: Library
+
+    for lib in libs:
+        lib.getTree()
+
+
+def main() -> None:
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup"
+    )
+    parser.add_argument("--books", type=int, default=BOOKS)
+    parser.add_argument("--libraries", type=int, default=LIBRARIES)
+    parser.add_argument("--files-per-book", type=int, default=3)
+    parser.add_argument("--output", "-o", help="file to write to instead of stdout")
+
+    args: argparse.Namespace = parser.parse_args()
+
+    binary_files: List[str] = []
+    database_files: List[str] = []
+    directory: str = tempfile.mkdtemp(prefix="bookstone-benchmark-")
+    file_names: List[str]
+    i: int
+    lazy: bool
+    lib: Library
+    libs: List[Library]
+    load: float
+    name: str
+    read: Callable[[str], Library]
+    results: List[StartupBenchmarkResult] = []
+    synthetic: SyntheticLibrary = SyntheticLibrary(files_per_book=args.files_per_book)
+
+    try:
+
+        print(f"creating {args.libraries} libraries", file=sys.stderr)
+
+        lib = createLibrary(synthetic, args.books)
+
+        for i in range(args.libraries):
+
+            binary_files.append(os.path.join(directory, f"{i}.library"))
+            database_files.append(os.path.join(directory, f"{i}.sqlite"))
+
+            with open(binary_files[-1], "wb") as f:
+                writeLibrary(lib, f)
+
+            sqlite_storage.writeLibrary(lib, database_files[-1], lib.takeChanges())
+
+        del lib
+
+        for name, file_names, lazy, read in [
+            ("binary", binary_files, False, lambda f: readLibrary(f)),
+            ("binary", binary_files, True, lambda f: readLibrary(f, tree=False)),
+            ("database", database_files, False, sqlite_storage.readLibrary),
+            (
+                "database",
+                database_files,
+                True,
+                lambda f: sqlite_storage.readLibrary(f, tree=False),
+            ),
+        ]:
+
+            print(f"{name}, lazy: {lazy}", file=sys.stderr)
+
+            libs = []
+            load = measure(lambda: loadAll(file_names, read, libs))
+
+            results.append(
+                StartupBenchmarkResult(
+                    libraries=args.libraries,
+                    books=args.books,
+                    format=name,
+                    lazy=lazy,
+                    load_seconds=load,
+                    tree_seconds=measure(lambda: loadTrees(libs)),
+                )
+            )
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "library": asdict(synthetic),
+        "results": [asdict(r) for r in results],
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,257 @@
+# compares saving and loading synthetic libraries as JSON, in the binary
+# library format, both uncompressed and compressed, and as SQLite database,
+# as well as the file sizes
+# "binary (mapped)" keeps the tree within the memory-mapped file,
+# no matter its size, so that it isn't decoded at all
+# "database (books only)" loads everything but the tree
+# the edit columns measure saving again after changing the tags of a single
+# book, which rewrites the whole file for all formats but the database
+# results are written as JSON, just like benchmarks.indexing
+# run with python -m benchmarks.storage from the repository root
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List
+
+from library import sqlite_storage
+from library.binary_storage import readLibrary, writeLibrary
+from library.book import Book
+from library.library import Library, LibraryChanges
+
+from .synthetic_library import SyntheticLibrary
+
+SIZES: List[int] = [1000, 10000, 100000]
+
+
+@dataclass
+class StorageBenchmarkResult:
+
+    books: int
+    format: str
+    save_seconds: float
+    load_seconds: float
+    file_size: int
+    edit_save_seconds: float
+    edit_written_bytes: int
+
+
+def measure(function: Callable[[], Any]) -> float:
+
+    start: float = time.perf_counter()
+
+    function()
+
+    return time.perf_counter() - start
+
+
+def createLibrary(synthetic: SyntheticLibrary, books: int) -> Library:
+
+    book: Book
+    lib: Library = Library()
+    path: str
+
+    lib.setName("benchmark")
+    lib.setPath("mem://")
+    lib.setTree(synthetic.buildTree(books))
+
+    for path in synthetic.iterBookPaths(books):
+
+        book = Book(path)
+        book.tags["author"].value = path.split(" - ")[0]
+        book.tags["title"].value = path.rsplit("/", 1)[-1]
+        lib.addBook(book)
+
+    return lib
+
+
+def saveJSON(lib: Library, file_name: str) -> None:
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write(json.dumps(lib.serialize(), indent=2))
+
+
+def loadJSON(file_name: str) -> Library:
+
+    lib: Library = Library()
+
+    with open(file_name, "r", encoding="utf-8") as f:
+        lib.deserialize(json.loads(f.read()))
+
+    return lib
+
+
+def saveBinary(lib: Library, file_name: str, compress: bool) -> None:
+    with open(file_name, "wb") as f:
+        writeLibrary(lib, f, compress=compress)
+
+
+def editBook(lib: Library) -> None:
+
+    book: Book = lib.getBooks()[0]
+
+    book.tags["title"].value += " (edited)"
+    lib.addBook(book)
+
+
+# the database is saved while another connection keeps it open,
+# so that the write-ahead log isn't merged into the database right away
+# and its size tells how much was written
+
+
+def measureDatabaseEdit(lib: Library, file_name: str) -> StorageBenchmarkResult:
+
+    changes: LibraryChanges
+    connection: sqlite3.Connection = sqlite3.connect(file_name)
+    edit: float
+
+    try:
+
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("SELECT COUNT(*) FROM metadata").fetchone()
+
+        editBook(lib)
+        changes = lib.takeChanges()
+        edit = measure(lambda: sqlite_storage.writeLibrary(lib, file_name, changes))
+
+        return StorageBenchmarkResult(
+            books=0,
+            format="",
+            save_seconds=0.0,
+            load_seconds=0.0,
+            file_size=0,
+            edit_save_seconds=edit,
+            edit_written_bytes=os.path.getsize(file_name + "-wal"),
+        )
+
+    finally:
+        connection.close()
+
+
+def run(directory: str, books: int, lib: Library) -> List[StorageBenchmarkResult]:
+
+    changes: LibraryChanges
+    compress: bool
+    edit: StorageBenchmarkResult
+    file_name: str
+    name: str
+    results: List[StorageBenchmarkResult] = []
+    save: float
+    threshold: int
+    tree: bool
+
+    file_name = os.path.join(directory, "library.json")
+    save = measure(lambda: saveJSON(lib, file_name))
+
+    editBook(lib)
+
+    results.append(
+        StorageBenchmarkResult(
+            books=books,
+            format="json",
+            save_seconds=save,
+            load_seconds=measure(lambda: loadJSON(file_name)),
+            file_size=os.path.getsize(file_name),
+            edit_save_seconds=measure(lambda: saveJSON(lib, file_name)),
+            edit_written_bytes=os.path.getsize(file_name),
+        )
+    )
+
+    for name, compress, threshold in [
+        ("binary", False, sys.maxsize),
+        ("binary (mapped)", False, 0),
+        ("binary (compressed)", True, sys.maxsize),
+    ]:
+
+        file_name = os.path.join(directory, f"library-{compress}.library")
+        save = measure(lambda: saveBinary(lib, file_name, compress))
+
+        editBook(lib)
+
+        results.append(
+            StorageBenchmarkResult(
+                books=books,
+                format=name,
+                save_seconds=save,
+                load_seconds=measure(lambda: readLibrary(file_name, threshold)),
+                file_size=os.path.getsize(file_name),
+                edit_save_seconds=measure(lambda: saveBinary(lib, file_name, compress)),
+                edit_written_bytes=os.path.getsize(file_name),
+            )
+        )
+
+    for name, tree in [("database", True), ("database (books only)", False)]:
+
+        file_name = os.path.join(directory, f"library-{books}-{tree}.sqlite")
+        # a database which doesn't exist yet is always written completely
+        changes = lib.takeChanges()
+        save = measure(lambda: sqlite_storage.writeLibrary(lib, file_name, changes))
+        edit = measureDatabaseEdit(lib, file_name)
+
+        results.append(
+            StorageBenchmarkResult(
+                books=books,
+                format=name,
+                save_seconds=save,
+                load_seconds=measure(
+                    lambda: sqlite_storage.readLibrary(file_name, tree=tree)
+                ),
+                file_size=os.path.getsize(file_name),
+                edit_save_seconds=edit.edit_save_seconds,
+                edit_written_bytes=edit.edit_written_bytes,
+            )
+        )
+
+    return results
+
+
+def main() -> None:
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m benchmarks.storage"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--files-per-book", type=int, default=3)
+    parser.add_argument("--output", "-o", help="file to write to instead of stdout")
+
+    args: argparse.Namespace = parser.parse_args()
+
+    books: int
+    directory: str = tempfile.mkdtemp(prefix="bookstone-benchmark-")
+    results: List[StorageBenchmarkResult] = []
+    synthetic: SyntheticLibrary = SyntheticLibrary(files_per_book=args.files_per_book)
+
+    try:
+
+        for books in args.sizes:
+
+            print(f"{books} books", file=sys.stderr)
+
+            results.extend(run(directory, books, createLibrary(synthetic, books)))
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "library": asdict(synthetic),
+        "results": [asdict(r) for r in results],
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+
+    main()
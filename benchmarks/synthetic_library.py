@@ -0,0 +1,133 @@
+# generates synthetic audiobook libraries which match both tag_matching.Patterns
+# every author has a few series with several volumes each (series pattern)
+# and a few standalone books (standalone pattern)
+
+import posixpath
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from fs.base import FS
+
+from library.node import Node
+
+
+@dataclass
+class SyntheticLibrary:
+
+    series_per_author: int = 2
+    volumes_per_series: int = 5
+    standalone_per_author: int = 5
+    files_per_book: int = 3
+    file_size: int = 0
+
+    def getBooksPerAuthor(self) -> int:
+        return (
+            self.series_per_author * self.volumes_per_series
+            + self.standalone_per_author
+        )
+
+    # yields the paths of books directories, relative to the library root
+
+    def iterBookPaths(self, books: int) -> Iterator[str]:
+
+        author: int = 0
+        count: int = 0
+        series: int
+        title: int
+        volume: int
+
+        while True:
+
+            for series in range(self.series_per_author):
+                for volume in range(self.volumes_per_series):
+
+                    if count >= books:
+                        return
+
+                    yield (
+                        f"Author {author} - Series {series}/"
+                        f"{volume + 1:02d} - Title {volume}"
+                    )
+                    count += 1
+
+            for title in range(self.standalone_per_author):
+
+                if count >= books:
+                    return
+
+                yield f"Author {author} - Standalone {title}"
+                count += 1
+
+            author += 1
+
+    def getFileNames(self) -> List[str]:
+        return [f"{i + 1:02d}.mp3" for i in range(self.files_per_book)]
+
+    # writes the library to the root of f
+
+    def generate(self, f: FS, books: int) -> None:
+
+        data: bytes = b"\0" * self.file_size
+        file_name: str
+        path: str
+
+        for path in self.iterBookPaths(books):
+
+            f.makedirs(path, recreate=True)
+
+            for file_name in self.getFileNames():
+                f.writebytes(posixpath.join(path, file_name), data)
+
+    # builds the tree indexing the generated library would result in
+
+    def buildTree(self, books: int) -> Node:
+
+        directory: Optional[Node]
+        file_name: str
+        name: str
+        node: Node
+        parent: Node
+        path: str
+        tree: Node = Node()
+
+        for path in self.iterBookPaths(books):
+
+            parent = tree
+
+            for name in path.split("/"):
+
+                directory = parent.findChild(name)
+
+                if directory is None:
+                    directory = Node(name)
+                    directory.setDirectory()
+                    directory.setModificationTime(datetime.now(timezone.utc))
+                    parent.addChild(directory)
+
+                parent = directory
+
+            for file_name in self.getFileNames():
+
+                node = Node(file_name)
+                node.setFile()
+                node.setSize(self.file_size)
+                node.setModificationTime(datetime.now(timezone.utc))
+                parent.addChild(node)
+
+        return tree
+
+
+def countNodes(tree: Node) -> int:
+
+    count: int = 0
+    node: Node
+    stack: List[Node] = [tree]
+
+    while stack:
+
+        node = stack.pop()
+        count += 1
+        stack.extend(node.getChildren())
+
+    return count
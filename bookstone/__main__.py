@@ -48,6 +48,7 @@ def main() -> None:
 
     app.exec_()
     lib_manager.unload()
+    container.connection_pool().close()
     am.uninitialize()
     conf_manager.save(utils.getConfigFile())
 
@@ -0,0 +1,248 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import fs
+import fs.errors
+from fs.base import FS
+
+# maximum amount of open connections per url
+MAX_CONNECTIONS_PER_URL: int = 8
+# idle connections will be checked before being handed out again
+# if they weren't used for this amount of seconds
+HEALTH_CHECK_AGE: int = 30
+# idle connections will be pinged in this interval to keep them alive, in seconds
+KEEPALIVE_INTERVAL: int = 60
+# idle connections will be closed after this amount of seconds
+IDLE_TIMEOUT: int = 600
+
+
+@dataclass
+class PooledConnection:
+
+    fs: FS
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class ConnectionPoolEntry:
+
+    idle: List[PooledConnection] = field(default_factory=list)
+    in_use: int = 0
+
+
+# keeps connections to (remote) filesystems open, so that they can be reused
+# by everyone who needs to access the same url, e.g. the indexer
+# opening a connection (login, TLS handshake, session negotiation)
+# is by far the most expensive part of short operations on remote libraries
+# all methods are thread-safe
+
+
+class ConnectionPool:
+
+    _closed: bool
+    _condition: threading.Condition
+    _entries: Dict[str, ConnectionPoolEntry]
+    _keepalive_thread: Optional[threading.Thread]
+    _max_connections: int
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS_PER_URL) -> None:
+
+        self._closed = False
+        self._condition = threading.Condition()
+        self._entries = {}
+        self._keepalive_thread = None
+        self._max_connections = max_connections
+
+    # returns an open connection to url
+    # blocks while the maximum amount of connections to url is in use
+    # the connection needs to be handed back with release() afterwards
+
+    def acquire(self, url: str) -> FS:
+
+        connection: Optional[PooledConnection] = None
+        entry: ConnectionPoolEntry
+
+        with self._condition:
+
+            entry = self._entries.setdefault(url, ConnectionPoolEntry())
+
+            while not entry.idle and entry.in_use >= self._max_connections:
+                self._condition.wait()
+
+            if entry.idle:
+                connection = entry.idle.pop()
+
+            entry.in_use += 1
+
+            self._start_keepalive()
+
+        try:
+
+            # idle connections might have been dropped by the server meanwhile
+            if connection and not self._is_healthy(connection):
+                self._close(connection.fs)
+                connection = None
+
+            if connection:
+                return connection.fs
+
+            return fs.open_fs(url)
+
+        except BaseException:
+
+            with self._condition:
+                entry.in_use -= 1
+                self._condition.notify_all()
+
+            raise
+
+    # broken connections will be closed instead of being reused
+
+    def release(self, url: str, f: FS, broken: bool = False) -> None:
+
+        close: bool
+
+        with self._condition:
+
+            entry: ConnectionPoolEntry = self._entries.setdefault(
+                url, ConnectionPoolEntry()
+            )
+
+            entry.in_use = max(0, entry.in_use - 1)
+
+            close = broken or self._closed
+
+            if not close:
+                entry.idle.append(PooledConnection(fs=f))
+
+            self._condition.notify_all()
+
+        if close:
+            self._close(f)
+
+    @contextmanager
+    def connection(self, url: str) -> Iterator[FS]:
+
+        f: FS = self.acquire(url)
+
+        try:
+            yield f
+        except (fs.errors.RemoteConnectionError, fs.errors.OperationFailed):
+            self.release(url, f, broken=True)
+            raise
+        except BaseException:
+            self.release(url, f)
+            raise
+        else:
+            self.release(url, f)
+
+    # pings idle connections and closes the ones unused for too long
+
+    def maintain(self) -> None:
+
+        connection: PooledConnection
+        entry: ConnectionPoolEntry
+        now: float = time.monotonic()
+        to_check: List[Tuple[str, PooledConnection]] = []
+        to_close: List[PooledConnection] = []
+        url: str
+
+        with self._condition:
+
+            for url, entry in self._entries.items():
+
+                for connection in entry.idle[:]:
+
+                    if now - connection.last_used >= IDLE_TIMEOUT:
+                        to_close.append(connection)
+                    elif now - connection.last_checked >= KEEPALIVE_INTERVAL:
+                        to_check.append((url, connection))
+                    else:
+                        continue
+
+                    entry.idle.remove(connection)
+
+        # checked connections are busy meanwhile, others can't take them
+        for url, connection in to_check:
+
+            if not self._is_healthy(connection):
+                to_close.append(connection)
+                continue
+
+            with self._condition:
+
+                if self._closed:
+                    to_close.append(connection)
+                else:
+                    self._entries[url].idle.append(connection)
+                    self._condition.notify_all()
+
+        for connection in to_close:
+            self._close(connection.fs)
+
+    def close(self) -> None:
+
+        connection: PooledConnection
+        entry: ConnectionPoolEntry
+        to_close: List[PooledConnection] = []
+
+        with self._condition:
+
+            self._closed = True
+
+            for entry in self._entries.values():
+                to_close.extend(entry.idle)
+                entry.idle.clear()
+
+            self._condition.notify_all()
+
+        for connection in to_close:
+            self._close(connection.fs)
+
+    def _is_healthy(self, connection: PooledConnection) -> bool:
+
+        if time.monotonic() - connection.last_checked < HEALTH_CHECK_AGE:
+            return True
+
+        try:
+            connection.fs.getinfo("/")
+        except Exception:
+            return False
+
+        connection.last_checked = time.monotonic()
+
+        return True
+
+    def _close(self, f: FS) -> None:
+
+        try:
+            f.close()
+        except Exception:
+            pass
+
+    def _start_keepalive(self) -> None:
+
+        if self._keepalive_thread is not None:
+            return
+
+        self._keepalive_thread = threading.Thread(
+            target=self._keepalive, name="ConnectionPool keepalive", daemon=True
+        )
+        self._keepalive_thread.start()
+
+    def _keepalive(self) -> None:
+
+        while True:
+
+            with self._condition:
+
+                self._condition.wait_for(lambda: self._closed, KEEPALIVE_INTERVAL)
+
+                if self._closed:
+                    return
+
+            self.maintain()
@@ -5,6 +5,7 @@ from PyQt5.QtWidgets import QApplication
 
 from audio.manager import AudioManager
 from configuration_manager import ConfigurationManager
+from connection_pool import ConnectionPool
 from library.manager import LibraryManager
 from ui.container import UIContainer
 from workers.container import WorkerContainer
@@ -14,12 +15,17 @@ class Container(DeclarativeContainer):
 
     application: Singleton[QApplication] = Singleton(QApplication, [])
 
-    worker = ContainerProvider(WorkerContainer, application=application)
+    connection_pool = Singleton(ConnectionPool)
+
+    worker = ContainerProvider(
+        WorkerContainer, application=application, connection_pool=connection_pool
+    )
 
     library_manager = Singleton(
         LibraryManager,
         library_indexing_worker_factory=worker.library_indexing_worker.provider,
         library_saver_worker_factory=worker.library_saver_worker.provider,
+        library_loader_worker_factory=worker.library_loader_worker.provider,
     )
 
     ui = ContainerProvider(
@@ -0,0 +1,405 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import uuid
+import zlib
+from array import array
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .book import Book
+from .columnar_tree import COLUMNAR_TREE_THRESHOLD, ColumnarNode, ColumnarTree
+from .library import Library
+from .node import Node
+
+LIBRARY_FILE_MAGIC: bytes = b"BSLB"
+LIBRARY_FILE_VERSION: int = 1
+
+# everything after the header is zlib compressed
+FLAG_COMPRESSED: int = 1
+
+# magic, version, flags
+_HEADER: struct.Struct = struct.Struct("<4sIQ")
+_SECTION_LENGTH: struct.Struct = struct.Struct("<Q")
+# path, uuid, first tag, tag count
+_BOOK: struct.Struct = struct.Struct("<I16sII")
+# name, value
+_TAG: struct.Struct = struct.Struct("<II")
+
+# the largest piece of data written at once
+_CHUNK_SIZE: int = 1 << 20
+# amount of books between two calls to check while preparing them
+_CHECK_INTERVAL: int = 4096
+
+# sections start at multiples of this, relative to the end of the header,
+# so that the columns of the tree can be used right from the file
+_ALIGNMENT: int = 8
+
+
+# a compact binary format for library files
+# the header is followed by these sections, every one of them preceded by
+# its length and padded to _ALIGNMENT bytes:
+# metadata: everything but books and tree, as utf-8 encoded JSON
+# strings: the string table for book paths as well as tag names and values,
+# consisting of the amount of strings, their end offsets and the utf-8 data
+# books: fixed-width book records, referring to the string table
+# tags: fixed-width tag records, referring to the string table
+# tree: the tree as written by ColumnarTree
+# all numbers are little-endian
+# uncompressed files are memory-mapped when being read and large trees are
+# used right from the mapping, so that only the parts actually accessed
+# ever need to be decoded
+
+
+class _StringTable:
+
+    _indices: Dict[str, int]
+    # end offset of every string within the pool
+    _offsets: array
+    _pool: bytearray
+
+    def __init__(self) -> None:
+
+        self._indices = {}
+        self._offsets = array("Q")
+        self._pool = bytearray()
+
+    def add(self, string: str) -> int:
+
+        index: int = self._indices.get(string, -1)
+
+        if index < 0:
+            index = len(self._offsets)
+            self._indices[string] = index
+            self._pool += string.encode()
+            self._offsets.append(len(self._pool))
+
+        return index
+
+    # the amount of bytes iterBytes() yields
+
+    def getSize(self) -> int:
+        return _SECTION_LENGTH.size * (len(self._offsets) + 1) + len(self._pool)
+
+    def iterBytes(self) -> Iterator[Union[bytes, memoryview]]:
+
+        offsets: array = self._offsets
+
+        if sys.byteorder == "big":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+
+        yield _SECTION_LENGTH.pack(len(offsets))
+        yield memoryview(offsets).cast("B")
+        yield memoryview(self._pool)
+
+
+def _read_strings(data: memoryview) -> List[str]:
+
+    count: int = _SECTION_LENGTH.unpack_from(data)[0]
+    offsets: Tuple[int, ...] = struct.unpack_from(
+        f"<{count}Q", data, _SECTION_LENGTH.size
+    )
+    pool: bytes = bytes(data[_SECTION_LENGTH.size * (count + 1) :])
+    start: int = 0
+    strings: List[str] = []
+    end: int
+
+    for end in offsets:
+        strings.append(pool[start:end].decode())
+        start = end
+
+    return strings
+
+
+# writes the library to file, section by section
+# the tree is converted into a ColumnarTree for that, if it isn't one already
+# everything is written in chunks of at most _CHUNK_SIZE bytes right away,
+# so that no more than the string table, the string indices of all books
+# and the tree columns are held in memory in addition to the library itself
+# check is called between all chunks and may raise to stop writing
+
+
+def writeLibrary(
+    lib: Library,
+    file: IO[bytes],
+    compress: bool = False,
+    check: Optional[Callable[[], None]] = None,
+) -> None:
+
+    book: Book
+    books: List[Book] = lib.getBooks()
+    compressor: Any = zlib.compressobj() if compress else None
+    i: int
+    metadata: bytes
+    name: str
+    paths: array = array("I")
+    position: int = 0
+    root: Node = lib.getTree()
+    strings: _StringTable = _StringTable()
+    tag_counts: array = array("I")
+    tags: Dict[str, str]
+    # name and value of every tag, laid out just like the tag records
+    tag_strings: array = array("I")
+    tree: ColumnarTree
+    tree_parts: List[Union[bytes, memoryview]]
+    value: str
+
+    def write(data: Union[bytes, memoryview]) -> None:
+
+        nonlocal position
+
+        position += len(data)
+
+        if compressor:
+            data = compressor.compress(data)
+
+        file.write(data)
+
+        if check:
+            check()
+
+    def writeSection(length: int, parts: Iterable[Union[bytes, memoryview]]) -> None:
+
+        end: int = position + _SECTION_LENGTH.size + length
+        offset: int
+        part: Union[bytes, memoryview]
+        view: memoryview
+
+        write(_SECTION_LENGTH.pack(length))
+
+        for part in parts:
+
+            view = memoryview(part)
+
+            for offset in range(0, len(view), _CHUNK_SIZE):
+                write(view[offset : offset + _CHUNK_SIZE])
+
+        if position != end:
+            raise ValueError("section length mismatch")
+
+        write(b"\0" * (-position % _ALIGNMENT))
+
+    def iterBookRecords() -> Iterator[bytes]:
+
+        book: Book
+        buffer: bytearray = bytearray(_CHUNK_SIZE // _BOOK.size * _BOOK.size)
+        first_tag: int = 0
+        i: int
+        offset: int = 0
+
+        for i, book in enumerate(books):
+
+            _BOOK.pack_into(
+                buffer,
+                offset,
+                paths[i],
+                uuid.UUID(book.uuid).bytes,
+                first_tag,
+                tag_counts[i],
+            )
+
+            first_tag += tag_counts[i]
+            offset += _BOOK.size
+
+            if offset == len(buffer):
+                yield bytes(buffer)
+                offset = 0
+
+        yield bytes(buffer[:offset])
+
+    file.write(
+        _HEADER.pack(
+            LIBRARY_FILE_MAGIC,
+            LIBRARY_FILE_VERSION,
+            FLAG_COMPRESSED if compress else 0,
+        )
+    )
+
+    for i, book in enumerate(books):
+
+        tags = book.tags.serialize()
+
+        paths.append(strings.add(book.path))
+        tag_counts.append(len(tags))
+
+        for name, value in tags.items():
+            tag_strings.append(strings.add(name))
+            tag_strings.append(strings.add(value))
+
+        if check and i % _CHECK_INTERVAL == 0:
+            check()
+
+    if sys.byteorder == "big":
+        tag_strings.byteswap()
+
+    if isinstance(root, ColumnarNode):
+        tree = root.getTree()
+    else:
+        tree = ColumnarTree.fromNode(root)
+
+    if check:
+        check()
+
+    metadata = json.dumps(lib.serializeMetadata()).encode()
+    tree_parts = list(tree.iterBytes())
+
+    writeSection(len(metadata), [metadata])
+    writeSection(strings.getSize(), strings.iterBytes())
+    writeSection(len(books) * _BOOK.size, iterBookRecords())
+    writeSection(
+        len(tag_strings) * tag_strings.itemsize, [memoryview(tag_strings).cast("B")]
+    )
+    writeSection(sum(len(p) for p in tree_parts), tree_parts)
+
+    if compressor:
+        file.write(compressor.flush())
+
+
+# smaller trees are turned into regular nodes again, so that they can be
+# modified and shared between indexing runs
+
+
+def _expand_tree(tree: ColumnarTree, threshold: int) -> Node:
+
+    if tree.getNodeCount() < threshold:
+        return tree.getRoot().toNode()
+
+    return tree.getRoot()
+
+
+# reads a library written by writeLibrary()
+# trees with at least threshold nodes stay ColumnarTrees
+# the tree is only turned into nodes once it is needed if tree is False,
+# the file stays mapped until then
+# raises ValueError if the file isn't a valid library file
+
+
+def readLibrary(
+    file_name: str, threshold: int = COLUMNAR_TREE_THRESHOLD, tree: bool = True
+) -> Library:
+
+    book: Book
+    book_records: memoryview
+    data: Union[bytes, mmap.mmap]
+    first_tag: int
+    flags: int
+    lib: Library = Library()
+    magic: bytes
+    metadata: Dict[str, Any]
+    offset: int
+    path: int
+    sections: List[memoryview] = []
+    strings: List[str]
+    tag_count: int
+    tag_records: memoryview
+    columnar_tree: ColumnarTree
+    uuid_bytes: bytes
+    version: int
+    view: memoryview
+
+    with open(file_name, "rb") as f:
+
+        try:
+            magic, version, flags = _HEADER.unpack(f.read(_HEADER.size))
+        except struct.error:
+            raise ValueError(f"{file_name} is not a library file")
+
+        if magic != LIBRARY_FILE_MAGIC or version != LIBRARY_FILE_VERSION:
+            raise ValueError(f"{file_name} is not a supported library file")
+
+        if flags & FLAG_COMPRESSED:
+
+            try:
+                data = zlib.decompress(f.read())
+            except zlib.error:
+                raise ValueError(f"{file_name} is damaged")
+
+            view = memoryview(data)
+        # a mapped file can't be replaced on Windows,
+        # which is how library files are saved
+        elif os.name == "nt":
+            data = f.read()
+            view = memoryview(data)
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(data)[_HEADER.size :]
+
+    offset = 0
+
+    try:
+
+        while offset < len(view):
+
+            length: int = _SECTION_LENGTH.unpack_from(view, offset)[0]
+            offset += _SECTION_LENGTH.size
+
+            sections.append(view[offset : offset + length])
+
+            offset += length
+            offset += -offset % _ALIGNMENT
+
+        metadata = json.loads(bytes(sections[0]).decode())
+        strings = _read_strings(sections[1])
+        book_records = sections[2]
+        tag_records = sections[3]
+        columnar_tree = ColumnarTree.fromBytes(sections[4], share=True)
+
+    except (IndexError, struct.error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"{file_name} is damaged")
+
+    try:
+
+        lib.deserialize(metadata)
+
+        for offset in range(0, len(book_records), _BOOK.size):
+
+            path, uuid_bytes, first_tag, tag_count = _BOOK.unpack_from(
+                book_records, offset
+            )
+
+            book = Book()
+            book.deserialize(
+                {
+                    "path": strings[path],
+                    "uuid": str(uuid.UUID(bytes=uuid_bytes)),
+                    "tags": dict(
+                        (strings[name], strings[value])
+                        for name, value in _TAG.iter_unpack(
+                            tag_records[
+                                first_tag
+                                * _TAG.size : (first_tag + tag_count)
+                                * _TAG.size
+                            ]
+                        )
+                    ),
+                }
+            )
+
+            lib.addBook(book)
+
+        if tree:
+            lib.setTree(_expand_tree(columnar_tree, threshold))
+        else:
+            lib.setTreeLoader(lambda: _expand_tree(columnar_tree, threshold))
+
+    # the records point to strings, tags and uuids which might not exist
+    except (IndexError, KeyError, struct.error, ValueError):
+        raise ValueError(f"{file_name} is damaged")
+
+    # everything matches the file now
+    lib.takeChanges()
+
+    return lib
@@ -0,0 +1,797 @@
+import bisect
+import struct
+import sys
+from array import array
+from datetime import datetime
+from mmap import mmap
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union, cast
+
+from .node import EPOCH, MICROSECOND, NODE_DIRECTORY, NODE_FILE, Node
+
+# trees with at least this amount of nodes will be stored as ColumnarTree
+COLUMNAR_TREE_THRESHOLD: int = 1000000
+
+COLUMNAR_TREE_MAGIC: bytes = b"BSCT"
+COLUMNAR_TREE_VERSION: int = 2
+
+# magic, version, node count, name pool size
+_HEADER: struct.Struct = struct.Struct("<4sIQQ")
+
+# the order of the columns within the binary data, for every version
+_COLUMNS: Dict[int, List[Tuple[str, str]]] = {
+    1: [
+        ("_parents", "i"),
+        ("_first_children", "i"),
+        ("_child_counts", "i"),
+        ("_types", "b"),
+        ("_sizes", "q"),
+        ("_modification_times", "q"),
+        ("_name_offsets", "q"),
+    ],
+    2: [
+        ("_sizes", "q"),
+        ("_modification_times", "q"),
+        ("_name_offsets", "q"),
+        ("_parents", "i"),
+        ("_first_children", "i"),
+        ("_child_counts", "i"),
+        ("_types", "b"),
+    ],
+}
+
+# columns are either arrays or views on the binary data the tree was read from
+Column = Union[array, memoryview]
+
+
+# stores a whole tree as parallel arrays instead of one object per node
+# nodes are stored in breadth-first order, so that the children of every node
+# and all descendants of a node on the same level are stored next to each other
+# children are sorted by their (utf-8 encoded) names, so that they can be
+# looked up by binary search
+# the tree is read-only, views on it are created on demand by getNode()
+# and behave like regular nodes, but can't be modified
+# the columns can also be used right from the data the tree was read from,
+# e.g. a memory-mapped file, without decoding the tree at all
+# the aggregates of the directories aren't stored, but calculated once
+# when they are needed for the first time
+
+
+class ColumnarTree:
+
+    _child_counts: Column
+    _file_counts: array
+    _first_children: Column
+    _modification_times: Column
+    _name_offsets: Column
+    _names: Union[bytes, memoryview]
+    _newest_modification_times: array
+    _parents: Column
+    _sizes: Column
+    _total_sizes: array
+    _types: Column
+
+    def __init__(self) -> None:
+
+        self._child_counts = array("i")
+        self._file_counts = array("i")
+        self._first_children = array("i")
+        self._modification_times = array("q")
+        self._name_offsets = array("q", [0])
+        self._names = b""
+        self._newest_modification_times = array("q")
+        self._parents = array("i")
+        self._sizes = array("q")
+        self._total_sizes = array("q")
+        self._types = array("b")
+
+    # subtrees shared with other columnar trees, like those of updated trees,
+    # are copied right from the columns of those, level by level
+
+    @classmethod
+    def fromNode(cls, root: Node) -> "ColumnarTree":
+
+        child_counts: array = array("i")
+        end: int
+        first: int
+        first_children: array = array("i")
+        i: int = 0
+        last: int
+        modification_times: array = array("q")
+        name_offsets: array = array("q", [0])
+        names: bytearray = bytearray()
+        node: Union[Node, int]
+        # regular nodes, or indices of nodes within the tree in sources
+        nodes: List[Union[Node, int]] = []
+        parents: array = array("i", [-1])
+        run: int
+        shift: int
+        sizes: array = array("q")
+        source: Optional[ColumnarTree]
+        sources: List[Optional[ColumnarTree]] = []
+        start: int
+        tree: ColumnarTree = cls()
+        types: array = array("b")
+
+        def copyNodes(source: "ColumnarTree", start: int, end: int) -> None:
+
+            offsets: Column = source._name_offsets
+            shift: int = len(names) - offsets[start]
+
+            types.extend(source._types[start:end])
+            sizes.extend(source._sizes[start:end])
+            modification_times.extend(source._modification_times[start:end])
+            names.extend(source._names[offsets[start] : offsets[end]])
+            name_offsets.extend(o + shift for o in offsets[start + 1 : end + 1])
+
+            nodes.extend(range(start, end))
+            sources.extend([source] * (end - start))
+
+        def addNode(node: Node) -> None:
+
+            if isinstance(node, ColumnarNode):
+                copyNodes(node._tree, node._index, node._index + 1)
+                return
+
+            types.append(NODE_FILE if node.isFile() else NODE_DIRECTORY)
+            sizes.append(node.getSize() if node.isFile() else -1)
+            modification_times.append(
+                (node.getModificationTime() - EPOCH) // MICROSECOND
+            )
+            names.extend(node.getName().encode())
+            name_offsets.append(len(names))
+
+            nodes.append(node)
+            sources.append(None)
+
+        addNode(root)
+
+        while i < len(nodes):
+
+            node = nodes[i]
+            source = sources[i]
+
+            if source is None:
+
+                first_children.append(len(nodes))
+
+                for child in sorted(
+                    cast(Node, node).getChildren(), key=lambda c: c.getName().encode()
+                ):
+                    addNode(child)
+
+                child_counts.append(len(nodes) - first_children[i])
+                parents.extend([i] * child_counts[i])
+
+                i += 1
+                continue
+
+            # consecutive nodes of another tree have their children stored
+            # next to each other within it as well, already sorted,
+            # so all of them are copied at once
+            start = cast(int, node)
+            end = start + 1
+            run = 1
+
+            while (
+                i + run < len(nodes)
+                and sources[i + run] is source
+                and nodes[i + run] == end
+            ):
+                end += 1
+                run += 1
+
+            first, last = source.getLevelRange(start, end)
+            shift = len(nodes) - first
+
+            first_children.extend(
+                source._first_children[index] + shift for index in range(start, end)
+            )
+            child_counts.extend(source._child_counts[start:end])
+            parents.extend(
+                source._parents[index] - start + i for index in range(first, last)
+            )
+            copyNodes(source, first, last)
+
+            i += run
+
+        tree._child_counts = child_counts
+        tree._first_children = first_children
+        tree._modification_times = modification_times
+        tree._name_offsets = name_offsets
+        tree._names = bytes(names)
+        tree._parents = parents
+        tree._sizes = sizes
+        tree._types = types
+
+        return tree
+
+    def getRoot(self) -> "ColumnarNode":
+        return ColumnarNode(self, 0)
+
+    def getNode(self, index: int) -> "ColumnarNode":
+        return ColumnarNode(self, index)
+
+    def getNodeCount(self) -> int:
+        return len(self._types)
+
+    def getName(self, index: int) -> str:
+        return sys.intern(self.getNameBytes(index).decode())
+
+    def getNameBytes(self, index: int) -> bytes:
+        return bytes(
+            self._names[self._name_offsets[index] : self._name_offsets[index + 1]]
+        )
+
+    def getParent(self, index: int) -> int:
+        return self._parents[index]
+
+    def getType(self, index: int) -> int:
+        return self._types[index]
+
+    def getSize(self, index: int) -> int:
+        return self._sizes[index]
+
+    def getModificationTime(self, index: int) -> datetime:
+        return EPOCH + self._modification_times[index] * MICROSECOND
+
+    def getFileCount(self, index: int) -> int:
+
+        self._calculate_aggregates()
+
+        return self._file_counts[index]
+
+    def getTotalSize(self, index: int) -> int:
+
+        self._calculate_aggregates()
+
+        return self._total_sizes[index]
+
+    def getNewestModificationTime(self, index: int) -> datetime:
+
+        self._calculate_aggregates()
+
+        return EPOCH + self._newest_modification_times[index] * MICROSECOND
+
+    def getAggregates(self, index: int) -> Tuple[int, int, int]:
+
+        self._calculate_aggregates()
+
+        return (
+            self._file_counts[index],
+            self._total_sizes[index],
+            self._newest_modification_times[index],
+        )
+
+    # children are always stored after their parents,
+    # so all aggregates can be summed up in a single backwards pass
+
+    def _calculate_aggregates(self) -> None:
+
+        count: int = self.getNodeCount()
+        counts: array
+        i: int
+        newest: array
+        parent: int
+        sizes: array
+
+        if len(self._file_counts) == count:
+            return
+
+        counts = array("i", bytes(count * 4))
+        newest = array("q", bytes(count * 8))
+        sizes = array("q", bytes(count * 8))
+
+        for i in range(count - 1, -1, -1):
+
+            if self._types[i] == NODE_FILE:
+                counts[i] = 1
+                sizes[i] = max(self._sizes[i], 0)
+                newest[i] = self._modification_times[i]
+
+            parent = self._parents[i]
+
+            if parent >= 0:
+
+                counts[parent] += counts[i]
+                sizes[parent] += sizes[i]
+
+                if newest[i] > newest[parent]:
+                    newest[parent] = newest[i]
+
+        self._file_counts = counts
+        self._newest_modification_times = newest
+        self._total_sizes = sizes
+
+    def getChildRange(self, index: int) -> Tuple[int, int]:
+
+        first: int = self._first_children[index]
+
+        return (first, first + self._child_counts[index])
+
+    # the range of all nodes one level below the nodes in start to end
+
+    def getLevelRange(self, start: int, end: int) -> Tuple[int, int]:
+
+        if start >= end:
+            return (start, end)
+
+        return (
+            self._first_children[start],
+            self._first_children[end - 1] + self._child_counts[end - 1],
+        )
+
+    def findChild(self, index: int, name: str) -> int:
+
+        encoded: bytes = name.encode()
+        first: int
+        last: int
+        position: int
+
+        first, last = self.getChildRange(index)
+
+        position = bisect.bisect_left(
+            _NameSequence(self, first, last), encoded  # type: ignore
+        )
+
+        if position < last - first and self.getNameBytes(first + position) == encoded:
+            return first + position
+
+        return -1
+
+    # all columns are written little-endian, no matter the platform
+    # the 8 byte wide columns come first, so that every column stays aligned
+    # as long as the data starts at an aligned position
+    # the parts are yielded one after another, so that they can be written
+    # without joining them first
+    # on little-endian platforms, the parts are views on the columns
+    # themselves, which must not change until they have been written
+
+    def iterBytes(self) -> Iterator[Union[bytes, memoryview]]:
+
+        column: Column
+        name: str
+        typecode: str
+
+        yield _HEADER.pack(
+            COLUMNAR_TREE_MAGIC,
+            COLUMNAR_TREE_VERSION,
+            self.getNodeCount(),
+            len(self._names),
+        )
+
+        for name, typecode in _COLUMNS[COLUMNAR_TREE_VERSION]:
+
+            column = getattr(self, name)
+
+            if sys.byteorder == "big":
+                column = array(typecode, column)
+                column.byteswap()
+
+            yield memoryview(column).cast("B")
+
+        yield memoryview(self._names)
+
+    def toBytes(self) -> bytes:
+        return b"".join(self.iterBytes())
+
+    # share: use the columns within data directly instead of copying them
+    # if possible, so that nodes are only decoded once they are accessed
+    # data must not be modified as long as the tree is in use then
+
+    @classmethod
+    def fromBytes(
+        cls, data: Union[bytes, memoryview, mmap], share: bool = False
+    ) -> "ColumnarTree":
+
+        column: Column
+        count: int
+        length: int
+        magic: bytes
+        name: str
+        names_size: int
+        offset: int = _HEADER.size
+        tree: ColumnarTree = cls()
+        typecode: str
+        version: int
+        view: memoryview = memoryview(data)
+
+        magic, version, count, names_size = _HEADER.unpack_from(view)
+
+        if magic != COLUMNAR_TREE_MAGIC or version not in _COLUMNS:
+            raise ValueError("unsupported columnar tree data")
+
+        for name, typecode in _COLUMNS[version]:
+
+            column = array(typecode)
+            length = (count + 1 if name == "_name_offsets" else count) * column.itemsize
+
+            if share and sys.byteorder == "little" and offset % column.itemsize == 0:
+                column = view[offset : offset + length].cast(typecode)
+            else:
+
+                column.frombytes(view[offset : offset + length])
+
+                if sys.byteorder == "big":
+                    column.byteswap()
+
+            setattr(tree, name, column)
+            offset += length
+
+        if share:
+            tree._names = view[offset : offset + names_size]
+        else:
+            tree._names = bytes(view[offset : offset + names_size])
+
+        return tree
+
+
+# lets bisect search the names of the children in start to end
+
+
+class _NameSequence:
+
+    _end: int
+    _start: int
+    _tree: ColumnarTree
+
+    def __init__(self, tree: ColumnarTree, start: int, end: int) -> None:
+
+        self._end = end
+        self._start = start
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._tree.getNameBytes(self._start + i)
+
+
+# a lightweight, read-only view on a single node of a ColumnarTree
+# the attributes of Node are never set, so every method of Node is overridden,
+# either reading from the tree or raising IOError for modifications
+
+
+class ColumnarNode(Node):
+
+    __slots__ = ("_index", "_tree")
+
+    _index: int
+    _tree: ColumnarTree
+
+    def __init__(self, tree: ColumnarTree, index: int) -> None:
+
+        self._index = index
+        self._tree = tree
+
+    def getTree(self) -> ColumnarTree:
+        return self._tree
+
+    def getIndex(self) -> int:
+        return self._index
+
+    # views are created anew whenever a node is accessed
+    def isSameNode(self, node: Node) -> bool:
+        return (
+            isinstance(node, ColumnarNode)
+            and node._tree is self._tree
+            and node._index == self._index
+        )
+
+    def _read_only(self) -> IOError:
+        return IOError(f"{self} is part of a read-only tree")
+
+    def setName(self, name: str) -> None:
+        raise self._read_only()
+
+    def getName(self) -> str:
+        return self._tree.getName(self._index)
+
+    def setDirectory(self) -> None:
+        raise self._read_only()
+
+    def setFile(self) -> None:
+        raise self._read_only()
+
+    def isDirectory(self) -> bool:
+        return self._tree.getType(self._index) == NODE_DIRECTORY
+
+    def isFile(self) -> bool:
+        return self._tree.getType(self._index) == NODE_FILE
+
+    def getChildren(self) -> List[Node]:
+        return [
+            self._tree.getNode(i) for i in range(*self._tree.getChildRange(self._index))
+        ]
+
+    def _iter_children(self) -> Iterator[Node]:
+        return iter(self.getChildren())
+
+    # for trees sharing subtrees of a columnar tree, whose nodes look up
+    # the children of the directories they contain directly
+    @property
+    def _children(self) -> Dict[str, Node]:  # type: ignore
+        return {c.getName(): c for c in self.getChildren()}
+
+    def addChild(self, child: Node) -> None:
+        raise self._read_only()
+
+    def addSharedChild(self, child: Node) -> None:
+        raise self._read_only()
+
+    def _attach_child(self, child: Node) -> None:
+        raise self._read_only()
+
+    # columnar trees never share nodes with other trees
+    def adoptSharedChildren(self) -> None:
+        pass
+
+    def getParent(self) -> Optional[Node]:
+
+        parent: int = self._tree.getParent(self._index)
+
+        if parent < 0:
+            return None
+
+        return self._tree.getNode(parent)
+
+    def setParent(self, parent: Optional[Node]) -> None:
+        raise self._read_only()
+
+    def getRoot(self) -> Node:
+        return self._tree.getRoot()
+
+    def isRoot(self) -> bool:
+        return self._tree.getParent(self._index) < 0
+
+    def getPath(self) -> str:
+
+        index: int = self._index
+        name: str
+        names: List[str] = []
+
+        while index >= 0:
+
+            name = self._tree.getName(index)
+
+            if name != "":
+                names.append(name)
+
+            index = self._tree.getParent(index)
+
+        return "/".join(reversed(names))
+
+    # paths aren't cached, but built from the names whenever needed
+
+    def _join_path(self, parent_path: str) -> str:
+
+        name: str = self.getName()
+
+        if parent_path == "" or name == "":
+            return parent_path + name
+
+        return parent_path + "/" + name
+
+    def _invalidate_paths(self) -> None:
+        pass
+
+    # columnar trees are searched by their names instead of an index
+
+    def _get_path_index(self) -> Optional[Dict[str, Node]]:
+        return None
+
+    def serialize(self) -> Dict[str, Any]:
+        return self.toNode().serialize()
+
+    def _serialize_attributes(self) -> Dict[str, Any]:
+        return self._create_node(self._index)._serialize_attributes()
+
+    def deserialize(self, serialized: Dict[str, Any]) -> None:
+        raise self._read_only()
+
+    def _deserialize_attributes(self, serialized: Dict[str, Any]) -> None:
+        raise self._read_only()
+
+    def findChild(self, location: Union[Node, str]) -> Optional[Node]:
+
+        index: int = self._index
+        name: str
+        path: Optional[str] = self._get_relative_path(location)
+
+        if path is None:
+            return None
+
+        if path == "":
+            return self
+
+        for name in path.split("/"):
+
+            index = self._tree.findChild(index, name)
+
+            if index < 0:
+                return None
+
+        return self._tree.getNode(index)
+
+    # same semantics as Node.iterChildren(), but every level is a single
+    # consecutive range of nodes, so no recursion is necessary
+
+    def iterChildren(
+        self,
+        depth: int = 0,
+        files: bool = True,
+        dirs: bool = True,
+    ) -> Iterator[Node]:
+
+        end: int = self._index + 1
+        i: int
+        level: int = 0
+        start: int = self._index
+        node_type: int
+
+        while True:
+
+            start, end = self._tree.getLevelRange(start, end)
+            level += 1
+
+            if start >= end:
+                return
+
+            if depth == 0 or level == depth:
+
+                for i in range(start, end):
+
+                    node_type = self._tree.getType(i)
+
+                    if (files and node_type == NODE_FILE) or (
+                        depth != 0 and dirs and node_type == NODE_DIRECTORY
+                    ):
+                        yield self._tree.getNode(i)
+
+            if level == depth:
+                return
+
+    def removeChild(self, child: Node) -> None:
+        raise self._read_only()
+
+    def removeAllChildren(self) -> None:
+        raise self._read_only()
+
+    def getModificationTime(self) -> datetime:
+        return self._tree.getModificationTime(self._index)
+
+    def setModificationTime(self, time: datetime) -> None:
+        raise self._read_only()
+
+    def getSize(self) -> int:
+
+        if not self.isFile():
+            raise IOError("{node} is not a file".format(node=self))
+
+        return self._tree.getSize(self._index)
+
+    def setSize(self, size: int) -> None:
+        raise self._read_only()
+
+    def getFileCount(self) -> int:
+        return self._tree.getFileCount(self._index)
+
+    def getTotalSize(self) -> int:
+        return self._tree.getTotalSize(self._index)
+
+    def getNewestModificationTime(self) -> datetime:
+        return self._tree.getNewestModificationTime(self._index)
+
+    def _get_aggregates(self) -> Tuple[int, int, int]:
+        return self._tree.getAggregates(self._index)
+
+    def _update_parent_aggregates(self, before: Tuple[int, int, int]) -> None:
+        raise self._read_only()
+
+    def _propagate_aggregates(
+        self, before: Tuple[int, int, int], after: Tuple[int, int, int]
+    ) -> None:
+        raise self._read_only()
+
+    # the tree calculates the aggregates of all nodes at once when needed
+    def _calculate_aggregates(self) -> None:
+        pass
+
+    def isParentOf(self, child: Union[Node, str]) -> bool:
+
+        own_path: str
+        path: str
+
+        if isinstance(child, str):
+            path = child
+        else:
+            path = child.getPath()
+
+        if self.isRoot():
+            return path != ""
+
+        own_path = self.getPath()
+
+        # whole names only, books/a isn't a parent of books/ab
+        return path == own_path or path.startswith(own_path + "/")
+
+    # copies the subtree starting at this node into regular, modifiable nodes
+
+    def toNode(self) -> Node:
+
+        child: Node
+        i: int
+        index: int
+        node: Node
+        queue: List[Tuple[int, Node]]
+        root: Node = self._create_node(self._index)
+
+        queue = [(self._index, root)]
+
+        while queue:
+
+            index, node = queue.pop()
+
+            for i in range(*self._tree.getChildRange(index)):
+
+                child = self._create_node(i)
+                node._attach_child(child)
+
+                if child.isDirectory():
+                    queue.append((i, child))
+
+        root._calculate_aggregates()
+
+        return root
+
+    def _create_node(self, index: int) -> Node:
+
+        node: Node = Node(self._tree.getName(index))
+
+        if self._tree.getType(index) == NODE_FILE:
+            node.setFile()
+            node.setSize(self._tree.getSize(index))
+
+        node.setModificationTime(self._tree.getModificationTime(index))
+
+        return node
+
+
+# returns a ColumnarTree backed view for trees which are large enough
+# and the tree itself otherwise
+# trees sharing subtrees with a columnar tree, like updates of one, are always
+# turned into columnar trees, since their shared nodes are read-only
+
+
+def compactTree(tree: Node, threshold: int = COLUMNAR_TREE_THRESHOLD) -> Node:
+
+    child: Node
+    count: int = 1
+    node: Node
+    stack: List[Node]
+
+    if isinstance(tree, ColumnarNode):
+        return tree
+
+    stack = [tree]
+
+    # only directories are ever shared
+    while stack and count < threshold:
+
+        node = stack.pop()
+
+        for child in node._iter_children():
+
+            count += 1
+
+            if child.isDirectory():
+
+                if isinstance(child, ColumnarNode):
+                    return ColumnarTree.fromNode(tree).getRoot()
+
+                stack.append(child)
+
+    if count < threshold:
+        return tree
+
+    return ColumnarTree.fromNode(tree).getRoot()
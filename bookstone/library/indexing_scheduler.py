@@ -0,0 +1,137 @@
+import urllib.parse
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+from .library import Library
+
+# amount of libraries being indexed at the same time
+MAX_CONCURRENT_INDEXING: int = 3
+# amount of libraries on the same host being indexed at the same time
+MAX_CONCURRENT_INDEXING_PER_HOST: int = 1
+
+
+class IndexingPriority(IntEnum):
+
+    refresh = 0  # e.g. the refresh of all libraries at startup
+    user = 1  # explicitly requested by the user
+
+
+# libraries on the same host share the same server or disk
+# local libraries all count as the same host
+
+
+def getLibraryHost(lib: Library) -> str:
+
+    try:
+        return urllib.parse.urlsplit(lib.getPath()).hostname or ""
+    except ValueError:
+        return ""
+
+
+@dataclass
+class IndexingRequest:
+
+    library: Library
+    priority: IndexingPriority
+    sequence: int
+
+
+# decides which libraries may be indexed next
+# requests with a higher priority are served first,
+# requests with the same priority in the order they were made
+
+
+class IndexingScheduler:
+
+    _max_concurrent: int
+    _max_concurrent_per_host: int
+    _queue: List[IndexingRequest]
+    _running: Dict[Library, str]
+    _sequence: int
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_INDEXING,
+        max_concurrent_per_host: int = MAX_CONCURRENT_INDEXING_PER_HOST,
+    ) -> None:
+
+        self._max_concurrent = max_concurrent
+        self._max_concurrent_per_host = max_concurrent_per_host
+        self._queue = []
+        self._running = {}
+        self._sequence = 0
+
+    def enqueue(
+        self, lib: Library, priority: IndexingPriority = IndexingPriority.refresh
+    ) -> None:
+
+        request: Optional[IndexingRequest]
+
+        if lib in self._running:
+            return
+
+        request = next((r for r in self._queue if r.library == lib), None)
+
+        if request:
+
+            if priority <= request.priority:
+                return
+
+            # requeue with the higher priority
+            request.priority = priority
+            request.sequence = self._sequence
+
+        else:
+
+            self._queue.append(
+                IndexingRequest(library=lib, priority=priority, sequence=self._sequence)
+            )
+
+        self._sequence += 1
+        self._queue.sort(key=lambda r: (-r.priority, r.sequence))
+
+    def remove(self, lib: Library) -> None:
+
+        self._queue = [r for r in self._queue if r.library != lib]
+
+    def finished(self, lib: Library) -> None:
+
+        if lib in self._running:
+            del self._running[lib]
+
+    # removes all libraries which can be started right now from the queue
+    # and considers them running until finished() is called for them
+
+    def takeStartable(self) -> List[Library]:
+
+        host: str
+        hosts: Dict[str, int] = {}
+        request: IndexingRequest
+        startable: List[Library] = []
+
+        for host in self._running.values():
+            hosts[host] = hosts.get(host, 0) + 1
+
+        for request in self._queue[:]:
+
+            if len(self._running) >= self._max_concurrent:
+                break
+
+            host = getLibraryHost(request.library)
+
+            if hosts.get(host, 0) >= self._max_concurrent_per_host:
+                continue
+
+            hosts[host] = hosts.get(host, 0) + 1
+            self._running[request.library] = host
+            self._queue.remove(request)
+            startable.append(request.library)
+
+        return startable
+
+    def isQueued(self, lib: Library) -> bool:
+        return any(r.library == lib for r in self._queue)
+
+    def getQueue(self) -> List[Library]:
+        return [r.library for r in self._queue]
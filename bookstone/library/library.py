@@ -1,40 +1,149 @@
+import base64
 import os
+import threading
 import uuid
-from typing import Any, Dict, List, Optional, Union
+import warnings
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Set, Union, cast
 
 import utils
+from connection_pool import MAX_CONNECTIONS_PER_URL
 
 from .book import Book
+from .columnar_tree import ColumnarNode, ColumnarTree, compactTree
 from .node import Node
+from .tree_diff import TreeDiff
+
+LIBRARY_FILE_EXTENSION: str = ".library"
+LIBRARY_DATABASE_EXTENSION: str = ".sqlite"
+LEGACY_LIBRARY_FILE_EXTENSION: str = ".json"
+
+
+# how a library is stored on disk
+# binary: a single file which is rewritten completely on every save,
+# but loads fastest
+# database: an SQLite database which only needs the changed parts of
+# the library to be written
+
+
+class LibraryStorage(Enum):
+
+    binary = "binary"
+    database = "database"
+
+
+# everything which changed within a library since it was last saved,
+# for storages which are able to write parts of a library only
+# books contains the paths of all books which were added, replaced or removed
+# nodes contains paths of nodes which changed themselves, subtrees those of
+# nodes which were added or removed along with everything below them
+# tree is set if the tree was replaced without knowing what changed,
+# everything if nothing is known about what was saved before
+
+
+@dataclass
+class LibraryChanges:
+
+    everything: bool = False
+    metadata: bool = False
+    books: Set[str] = field(default_factory=set)
+    tree: bool = False
+    nodes: Set[str] = field(default_factory=set)
+    subtrees: Set[str] = field(default_factory=set)
+
+    def isEmpty(self) -> bool:
+        return not (
+            self.everything
+            or self.metadata
+            or self.books
+            or self.tree
+            or self.nodes
+            or self.subtrees
+        )
+
+    def addTreeDiff(self, diff: TreeDiff) -> None:
+        self.nodes.update(diff.modified)
+        self.subtrees.update(diff.added)
+        self.subtrees.update(diff.removed)
+
+    def update(self, changes: "LibraryChanges") -> None:
+        self.everything = self.everything or changes.everything
+        self.metadata = self.metadata or changes.metadata
+        self.books.update(changes.books)
+        self.tree = self.tree or changes.tree
+        self.nodes.update(changes.nodes)
+        self.subtrees.update(changes.subtrees)
 
 
 class Library:
 
     _books: Dict[str, Book]
+    _changes: LibraryChanges
+    # of the tree, as known while it isn't loaded
+    _file_count: int
     _groups: List[str]
+    _indexing_connections: int
     _name: str
     _path: str
-    _tree: Node
+    _storage: LibraryStorage
+    _total_size: int
+    _tree: Optional[Node]
+    _tree_loader: Optional[Callable[[], Node]]
+    _tree_lock: threading.Lock
     _uuid: uuid.UUID
+    _watched: bool
 
     def __init__(self) -> None:
 
         self._books = {}
+        self._changes = LibraryChanges(everything=True)
+        self._file_count = 0
         self._groups = []
+        self._indexing_connections = 1
         self._uuid = uuid.uuid4()
         self._name = ""
         self._tree = Node()
+        self._tree_loader = None
+        self._tree_lock = threading.Lock()
         self._path = ""
+        self._storage = LibraryStorage.binary
+        self._total_size = 0
+        self._watched = False
 
     def serialize(self) -> Dict[str, Any]:
 
+        ser: Dict[str, Any] = self.serializeMetadata()
+
+        tree: Node = self.getTree()
+
+        ser["books"] = [b.serialize() for b in self._books.values()]
+
+        # large trees are stored as their raw columns instead of nested objects
+        if isinstance(tree, ColumnarNode):
+            ser["columnar_tree"] = base64.b64encode(tree.getTree().toBytes()).decode(
+                "ascii"
+            )
+        else:
+            ser["tree"] = tree.serialize()
+
+        return ser
+
+    # everything but books and tree
+    # file count and total size of the tree are included, so that they are
+    # known without loading the tree
+
+    def serializeMetadata(self) -> Dict[str, Any]:
         return {
             "name": self._name,
             "path": self._path,
             "uuid": str(self._uuid),
-            "tree": self._tree.serialize(),
-            "books": [b.serialize() for b in self._books.values()],
             "groups": self._groups,
+            "indexing_connections": self._indexing_connections,
+            "watched": self._watched,
+            "storage": self._storage.value,
+            "file_count": self.getFileCount(),
+            "total_size": self.getTotalSize(),
         }
 
     def deserialize(self, serialized: Dict[str, Any]) -> None:
@@ -43,11 +152,30 @@ class Library:
         self._name = serialized.get("name", "")
         self._path = serialized.get("path", "")
         self._groups = serialized.get("groups", [])
-
+        self._indexing_connections = min(
+            max(1, serialized.get("indexing_connections", 1)), MAX_CONNECTIONS_PER_URL
+        )
+        self._watched = serialized.get("watched", False)
+        self._storage = LibraryStorage(
+            serialized.get("storage", LibraryStorage.binary.value)
+        )
+        self._file_count = serialized.get("file_count", 0)
+        self._total_size = serialized.get("total_size", 0)
+        self._changes.everything = True
+
+        root: Node
         tree: Dict[str, Any] = serialized.get("tree", {})
 
-        if tree:
-            self._tree.deserialize(tree)
+        if "columnar_tree" in serialized:
+            self.setTree(
+                ColumnarTree.fromBytes(
+                    base64.b64decode(serialized["columnar_tree"])
+                ).getRoot()
+            )
+        elif tree:
+            root = Node()
+            root.deserialize(tree)
+            self.setTree(compactTree(root))
 
         books: List[Dict[str, Any]] = serialized.get("books", [])
         book: Dict[str, Any]
@@ -75,27 +203,126 @@ class Library:
 
     def setName(self, name: str) -> None:
         self._name = name
+        self._changes.metadata = True
 
     def getPath(self) -> str:
         return self._path
 
     def setPath(self, path: str) -> None:
         self._path = path
+        self._changes.metadata = True
+
+    # loads the tree first if needed, which may be done from any thread
+    # a tree which can't be loaded is replaced by an empty one,
+    # which the next indexing run will fill again
 
     def getTree(self) -> Node:
-        return self._tree
 
-    def setTree(self, tree: Node) -> None:
-        self._tree = tree
+        tree: Optional[Node] = self._tree
+
+        if tree is not None:
+            return tree
+
+        with self._tree_lock:
+
+            if self._tree is None:
+
+                try:
+                    self._tree = cast(Callable[[], Node], self._tree_loader)()
+                except (OSError, ValueError) as exc:
+                    warnings.warn(f"unable to load tree of library {self._name}: {exc}")
+                    self._tree = Node()
+                    self._changes.tree = True
+
+                self._tree_loader = None
+
+            return self._tree
+
+    # diff describes how the tree changed, if known
+    # the tree is considered to be replaced completely otherwise
+
+    def setTree(self, tree: Node, diff: Optional[TreeDiff] = None) -> None:
+
+        with self._tree_lock:
+            self._tree = tree
+            self._tree_loader = None
+
+        if diff is None:
+            self._changes.tree = True
+        else:
+            self._changes.addTreeDiff(diff)
+
+    # lets the tree be loaded by loader once it is needed for the first time,
+    # so that libraries can be used without waiting for their trees
+
+    def setTreeLoader(self, loader: Callable[[], Node]) -> None:
+
+        with self._tree_lock:
+            self._tree = None
+            self._tree_loader = loader
+
+    def isTreeLoaded(self) -> bool:
+        return self._tree is not None
+
+    # file count and total size of the tree, without loading it
+
+    def getFileCount(self) -> int:
+
+        tree: Optional[Node] = self._tree
+
+        if tree is None:
+            return self._file_count
+
+        return tree.getFileCount()
+
+    def getTotalSize(self) -> int:
+
+        tree: Optional[Node] = self._tree
+
+        if tree is None:
+            return self._total_size
+
+        return tree.getTotalSize()
 
     def getBooks(self) -> List[Book]:
         return list(self._books.values())
 
     def getFileName(self) -> str:
-        return os.path.join(utils.getLibrariesDirectory(), str(self._uuid) + ".json")
+
+        extension: str = LIBRARY_FILE_EXTENSION
+
+        if self._storage == LibraryStorage.database:
+            extension = LIBRARY_DATABASE_EXTENSION
+
+        return os.path.join(utils.getLibrariesDirectory(), str(self._uuid) + extension)
+
+    # libraries used to be stored as JSON, those files are migrated
+    # to the binary format when being loaded
+
+    def getLegacyFileName(self) -> str:
+        return os.path.join(
+            utils.getLibrariesDirectory(),
+            str(self._uuid) + LEGACY_LIBRARY_FILE_EXTENSION,
+        )
+
+    # every file this library might have been stored in, whatever its
+    # current storage is, including the ones SQLite keeps next to a database
+
+    def getAllFileNames(self) -> List[str]:
+
+        stem: str = os.path.join(utils.getLibrariesDirectory(), str(self._uuid))
+
+        return [
+            stem + LIBRARY_FILE_EXTENSION,
+            stem + LIBRARY_DATABASE_EXTENSION,
+            stem + LIBRARY_DATABASE_EXTENSION + "-wal",
+            stem + LIBRARY_DATABASE_EXTENSION + "-shm",
+            stem + LEGACY_LIBRARY_FILE_EXTENSION,
+        ]
 
     def addBook(self, book: Book) -> None:
         self._books[book.path] = book
+        self._changes.books.add(book.path)
 
     def findBook(self, book: Union[Book, str]) -> Optional[Book]:
 
@@ -108,19 +335,77 @@ class Library:
 
     def removeBook(self, book: Book) -> None:
         del self._books[book.path]
+        self._changes.books.add(book.path)
 
     def __hash__(self) -> int:
         return self._uuid.int
 
     def setBooks(self, books: List[Book]) -> None:
 
+        self._changes.books.update(self._books)
         self._books.clear()
 
         for b in books:
             self._books[b.path] = b
+            self._changes.books.add(b.path)
 
     def getGroups(self) -> List[str]:
         return self._groups[:]
 
     def setGroups(self, groups: List[str]) -> None:
         self._groups = groups[:]
+        self._changes.metadata = True
+
+    # amount of connections the indexer opens in parallel to crawl this library
+    # remote libraries benefit greatly from multiple connections, since every
+    # directory listing costs at least one round-trip
+
+    def getIndexingConnections(self) -> int:
+        return self._indexing_connections
+
+    def setIndexingConnections(self, connections: int) -> None:
+        # the connection pool wouldn't hand out more than that anyway
+        self._indexing_connections = min(max(1, connections), MAX_CONNECTIONS_PER_URL)
+        self._changes.metadata = True
+
+    # watched libraries are kept up to date by listening for changes
+    # instead of waiting for the next indexing run
+    # only supported for local libraries
+
+    def isWatched(self) -> bool:
+        return self._watched
+
+    def setWatched(self, watched: bool) -> None:
+        self._watched = watched
+        self._changes.metadata = True
+
+    def getStorage(self) -> LibraryStorage:
+        return self._storage
+
+    # the new storage doesn't know anything about this library yet
+
+    def setStorage(self, storage: LibraryStorage) -> None:
+
+        if storage == self._storage:
+            return
+
+        self._storage = storage
+        self._changes.everything = True
+
+    # hands all changes made since the last call over to the caller,
+    # usually to save them
+    # changes which couldn't be saved need to be given back with restoreChanges()
+
+    def takeChanges(self) -> LibraryChanges:
+
+        changes: LibraryChanges = self._changes
+
+        self._changes = LibraryChanges()
+
+        return changes
+
+    def restoreChanges(self, changes: LibraryChanges) -> None:
+        self._changes.update(changes)
+
+    def hasChanges(self) -> bool:
+        return not self._changes.isEmpty()
@@ -0,0 +1,81 @@
+import json
+import os
+import os.path
+from typing import Any, Dict, List
+
+from . import sqlite_storage
+from .binary_storage import readLibrary
+from .library import (
+    LEGACY_LIBRARY_FILE_EXTENSION,
+    LIBRARY_DATABASE_EXTENSION,
+    LIBRARY_FILE_EXTENSION,
+    Library,
+)
+
+# finds the file to load for every library within directory
+# binary library files and databases are preferred, JSON files are only
+# loaded if there is neither for the same library
+# if a library was switched to another storage while saving it got
+# interrupted, the newer of both files wins
+
+
+def findLibraryFiles(directory: str) -> List[str]:
+
+    extension: str
+    file_name: str
+    files: Dict[str, str] = {}
+    path: str
+    stem: str
+
+    for file_name in sorted(os.listdir(directory)):
+
+        stem, extension = os.path.splitext(file_name)
+        path = os.path.join(directory, file_name)
+
+        if extension not in (
+            LIBRARY_FILE_EXTENSION,
+            LIBRARY_DATABASE_EXTENSION,
+            LEGACY_LIBRARY_FILE_EXTENSION,
+        ):
+            continue
+
+        if stem not in files or (
+            extension != LEGACY_LIBRARY_FILE_EXTENSION
+            and (
+                isLegacyLibraryFile(files[stem])
+                or os.path.getmtime(path) > os.path.getmtime(files[stem])
+            )
+        ):
+            files[stem] = path
+
+    return list(files.values())
+
+
+def isLegacyLibraryFile(file_name: str) -> bool:
+    return file_name.endswith(LEGACY_LIBRARY_FILE_EXTENSION)
+
+
+# reads a library from any kind of library file
+# trees of binary library files and databases are only loaded once needed,
+# JSON files are read completely, since they need to be migrated anyway
+# raises OSError or ValueError if the file can't be read
+
+
+def readLibraryFile(file_name: str) -> Library:
+
+    lib: Library
+    ser: Dict[str, Any]
+
+    if file_name.endswith(LIBRARY_FILE_EXTENSION):
+        return readLibrary(file_name, tree=False)
+
+    if file_name.endswith(LIBRARY_DATABASE_EXTENSION):
+        return sqlite_storage.readLibrary(file_name, tree=False)
+
+    with open(file_name, "r", encoding="utf-8") as f:
+        ser = json.load(f)
+
+    lib = Library()
+    lib.deserialize(ser)
+
+    return lib
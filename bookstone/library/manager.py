@@ -1,24 +1,34 @@
-import json
 import os
 import os.path
-import warnings
-from dataclasses import dataclass
-from json.decoder import JSONDecodeError
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, cast
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, cast
 
-import fs.osfs
 from dependency_injector.providers import Factory
-from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from PyQt5.QtCore import QObject, Qt, QThread, QTimer, pyqtSignal
 
 from utils import getLibrariesDirectory
-from workers.library_indexing import LibraryIndexingResult, LibraryIndexingWorker
-
+from workers.indexing_checkpoint import removeCheckpoint
+from workers.library_indexing import (
+    LibraryIndexingPhase,
+    LibraryIndexingProgress,
+    LibraryIndexingResult,
+    LibraryIndexingWorker,
+)
+
+from .indexing_scheduler import IndexingPriority, IndexingScheduler
 from .library import Library
+from .library_files import findLibraryFiles
 from .node import Node
+from .tree_diff import LibraryDelta
+from .watcher import LibraryWatcher
 
 if TYPE_CHECKING:
+    from workers.library_loader import LibraryLoaderWorker
     from workers.library_saver import LibrarySaverWorker
 
+# time to wait for further save requests before saving, in milliseconds
+SAVE_DELAY: int = 1000
+
 
 # stores all indexing state related information
 
@@ -27,97 +37,196 @@ if TYPE_CHECKING:
 class LibraryState:
     indexing_thread: Optional[QThread] = None
     indexing_worker: Optional[LibraryIndexingWorker] = None
+    # updates of the directories reported by the watcher
+    update_thread: Optional[QThread] = None
+    update_worker: Optional[LibraryIndexingWorker] = None
+    # directories reported meanwhile, which still need to be updated
+    update_paths: Set[str] = field(default_factory=set)
     saver_thread: Optional[QThread] = None
     saver_worker: Optional["LibrarySaverWorker"] = None
-    last_indexing_status: str = "Waiting."
+    # the library changed since the current or last save started
+    save_pending: bool = False
+    save_timer: Optional[QTimer] = None
+    watcher: Optional[LibraryWatcher] = None
+    indexing_progress: LibraryIndexingProgress = field(
+        default_factory=LibraryIndexingProgress
+    )
 
 
 # keeps track of all libraries
 # it also manages the indexing process
+# libraries waiting to be indexed are queued in the indexing scheduler,
+# which limits how many of them get indexed at the same time
+# changes reported by the watcher are applied by updating only the changed
+# directories on another thread, one update per library at a time and never
+# while the library is being indexed, since indexing covers them as well
+# libraries are saved behind the scenes: save() only marks a library as
+# changed, and it is written SAVE_DELAY milliseconds after the first request,
+# so that all requests in between are covered by a single save
+# a library changing while being saved is saved again right afterwards,
+# and all pending saves are done by unload()
 
 
 class LibraryManager(QObject):
 
+    _indexing_scheduler: IndexingScheduler
     _library_states: Dict[Library, LibraryState]
     _libraries: List[Library]
     _library_indexing_worker_factory: Factory[LibraryIndexingWorker]
+    _library_loader_worker_factory: Factory["LibraryLoaderWorker"]
     _library_saver_worker_factory: Factory["LibrarySaverWorker"]
+    _loader_thread: Optional[QThread]
+    _loader_worker: Optional["LibraryLoaderWorker"]
 
     libraryAdded: pyqtSignal = pyqtSignal(Library)
     libraryRemoved: pyqtSignal = pyqtSignal(Library)
+    # the library changed in a way which requires reading it again completely
     libraryUpdated: pyqtSignal = pyqtSignal(Library)
+    # emitted by indexing runs and watcher updates instead of libraryUpdated,
+    # carrying what actually changed so that it doesn't have to be
+    # found out by comparing the whole library again
+    libraryChanged: pyqtSignal = pyqtSignal(Library, LibraryDelta)
+    # all libraries found by load() were added
+    librariesLoaded: pyqtSignal = pyqtSignal()
 
     def __init__(
         self,
         library_indexing_worker_factory: Factory[LibraryIndexingWorker],
         library_saver_worker_factory: Factory["LibrarySaverWorker"],
+        library_loader_worker_factory: Factory["LibraryLoaderWorker"],
     ) -> None:
 
         super().__init__()
 
+        self._indexing_scheduler = IndexingScheduler()
         self._library_states = {}
         self._libraries = []
         self._library_indexing_worker_factory = library_indexing_worker_factory
         self._library_saver_worker_factory = library_saver_worker_factory
+        self._library_loader_worker_factory = library_loader_worker_factory
+        self._loader_thread = None
+        self._loader_worker = None
 
     def addLibrary(self, lib: Library) -> None:
         self._libraries.append(lib)
         self._library_states[lib] = LibraryState()
         self.libraryAdded.emit(lib)
+        self.updateWatching(lib)
 
     def getLibraries(self) -> List[Library]:
         return self._libraries[:]
 
     def removeLibrary(self, lib: Library) -> None:
 
+        file_name: str
         i: int = self._libraries.index(lib)
         thread: QThread
 
+        self._indexing_scheduler.remove(lib)
+
         if lib in self._library_states:
             if self._library_states[lib].indexing_thread:
+                if self._library_states[lib].indexing_worker:
+                    cast(
+                        LibraryIndexingWorker, self._library_states[lib].indexing_worker
+                    ).cancel()
                 thread = cast(QThread, self._library_states[lib].indexing_thread)
                 thread.requestInterruption()
                 thread.quit()
                 thread.wait()
+            self._stop_updating(lib)
             if self._library_states[lib].saver_thread:
+                if self._library_states[lib].saver_worker:
+                    cast(
+                        "LibrarySaverWorker", self._library_states[lib].saver_worker
+                    ).cancel()
                 thread = cast(QThread, self._library_states[lib].saver_thread)
                 thread.requestInterruption()
                 thread.quit()
                 thread.wait()
+            if self._library_states[lib].watcher:
+                cast(LibraryWatcher, self._library_states[lib].watcher).stop()
+            if self._library_states[lib].save_timer:
+                cast(QTimer, self._library_states[lib].save_timer).stop()
             del self._library_states[lib]
 
-        if os.path.exists(lib.getFileName()):
-            os.remove(lib.getFileName())
+        self._indexing_scheduler.finished(lib)
+
+        for file_name in lib.getAllFileNames():
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+        removeCheckpoint(lib)
 
         del self._libraries[i]
         self.libraryRemoved.emit(lib)
 
+        self._schedule_indexing()
+
+    # reads all libraries on other threads, adding every library
+    # as soon as it is ready, see LibraryLoaderWorker
+    # libraries read from legacy JSON files are migrated right away
+    # trees are only loaded once they are needed, which is usually
+    # when the library gets indexed, on the indexing thread
+
     def load(self) -> None:
 
-        f: fs.osfs.OSFS = fs.osfs.OSFS(getLibrariesDirectory(), create=True)
+        directory: str = getLibrariesDirectory()
+        thread: QThread
+        worker: LibraryLoaderWorker
 
-        libraries: List[str] = f.listdir(".")
+        if self._loader_thread:
+            return
 
-        for lib in libraries:
+        os.makedirs(directory, exist_ok=True)
 
-            data: str = f.readtext(lib)
+        worker = self._library_loader_worker_factory(
+            file_names=findLibraryFiles(directory)
+        )
+        thread = QThread(parent=self)
 
-            try:
-                ser: Dict[str, Any] = json.loads(data)
-            except JSONDecodeError:
-                warnings.warn(f"invalid json data found in {lib}")
-                continue
+        worker.moveToThread(thread)
 
-            l: Library = Library()
-            l.deserialize(ser)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
 
-            self.addLibrary(l)
+        worker.loaded.connect(self._library_loaded)
+        worker.finished.connect(self._loader_finished)
 
-        f.close()
+        self._loader_thread = thread
+        self._loader_worker = worker
 
-        self.startIndexing()
+        thread.start()
+
+    def isLoading(self) -> bool:
+        return self._loader_thread is not None
 
-    def startIndexing(self, lib: Optional[Library] = None) -> None:
+    def _library_loaded(self, lib: Library, migrate: bool) -> None:
+
+        if lib in self._library_states:
+            return
+
+        self.addLibrary(lib)
+
+        if migrate:
+            self.save(lib)
+
+        self.startIndexing(lib)
+
+    def _loader_finished(self) -> None:
+
+        self._loader_thread = None
+        self._loader_worker = None
+
+        self.librariesLoaded.emit()
+
+    def startIndexing(
+        self,
+        lib: Optional[Library] = None,
+        priority: IndexingPriority = IndexingPriority.refresh,
+    ) -> None:
 
         libs: List[Library]
 
@@ -131,47 +240,100 @@ class LibraryManager(QObject):
             if self._library_states[lib].indexing_thread:
                 continue
 
-            worker: LibraryIndexingWorker = self._library_indexing_worker_factory(
-                library=lib
+            self._indexing_scheduler.enqueue(lib, priority)
+
+        self._schedule_indexing()
+
+    # starts as many queued libraries as the scheduler allows
+    # and updates the queue positions of all others
+
+    def _schedule_indexing(self) -> None:
+
+        i: int
+        lib: Library
+
+        for lib in self._indexing_scheduler.takeStartable():
+            self._start_indexing_thread(lib)
+
+        for i, lib in enumerate(self._indexing_scheduler.getQueue()):
+            self._library_states[lib].indexing_progress = LibraryIndexingProgress(
+                phase=LibraryIndexingPhase.queued, queue_position=i
             )
-            thread: QThread = QThread(parent=self)
 
-            worker.moveToThread(thread)
+    def _start_indexing_thread(self, lib: Library) -> None:
+
+        thread: QThread
+        worker: LibraryIndexingWorker
+
+        # the crawl will find all changes on its own
+        self._stop_updating(lib)
+        self._library_states[lib].update_paths.clear()
+
+        worker = self._library_indexing_worker_factory(library=lib)
+        thread = QThread(parent=self)
+
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
 
-            thread.started.connect(worker.run)
-            worker.finished.connect(thread.quit)
-            worker.finished.connect(worker.deleteLater)
-            thread.finished.connect(thread.deleteLater)
+        worker.result.connect(self._receive_indexing_result)
+        worker.progress.connect(self._indexing_progress)
 
-            worker.result.connect(self._receive_indexing_result)
-            worker.status.connect(self._indexing_status)
+        self._library_states[lib].indexing_thread = thread
+        self._library_states[lib].indexing_worker = worker
 
-            self._library_states[lib].indexing_thread = thread
-            self._library_states[lib].indexing_worker = worker
+        # the watcher must not touch the tree while it is being crawled
+        self._set_watcher_paused(lib, True)
 
-            thread.start()
+        thread.start()
 
     def _receive_indexing_result(self, result: LibraryIndexingResult) -> None:
 
         lib: Library = result.library
-        new_tree: Node
 
         self._library_states[lib].indexing_thread = None
         self._library_states[lib].indexing_worker = None
 
-        if not result.tree:
-            return
+        self._indexing_scheduler.finished(lib)
+        self._schedule_indexing()
+
+        if result.tree:
+            self._apply_indexing_result(result)
+
+        self._set_watcher_paused(lib, False)
+        self._start_updating(lib)
 
-        new_tree = result.tree
+    def _apply_indexing_result(self, result: LibraryIndexingResult) -> None:
+
+        delta: LibraryDelta = LibraryDelta(
+            tree=result.tree_diff,
+            added=result.added,
+            removed=result.removed,
+            changed=result.changed,
+        )
+        lib: Library = result.library
+        new_tree: Node = cast(Node, result.tree)
 
-        # we will simply replace the old tree with the new one
-        lib.setTree(new_tree)
+        # the new tree shares all unchanged directories with the old one,
+        # which isn't needed anymore once replaced
+        if new_tree is not lib.getTree():
+            new_tree.adoptSharedChildren()
 
-        # and the old books with the new ones
+        lib.setTree(new_tree, result.tree_diff)
 
-        lib.setBooks(result.books)
+        # books however will only be touched if they actually changed
 
-        self.libraryUpdated.emit(lib)
+        for book in result.removed:
+            lib.removeBook(book)
+
+        for book in result.added + result.changed:
+            lib.addBook(book)
+
+        if not delta.isEmpty():
+            self.libraryChanged.emit(lib, delta)
 
         self.save(lib)
 
@@ -185,6 +347,16 @@ class LibraryManager(QObject):
         else:
             libs = self._libraries
 
+        # queued libraries need to be removed first,
+        # otherwise they might start as soon as the running ones are stopped
+        for lib in libs:
+
+            if not self._indexing_scheduler.isQueued(lib):
+                continue
+
+            self._indexing_scheduler.remove(lib)
+            self._library_states[lib].indexing_progress = LibraryIndexingProgress()
+
         for lib in libs:
 
             if not self._library_states[lib].indexing_thread:
@@ -192,6 +364,11 @@ class LibraryManager(QObject):
 
             thread = cast(QThread, self._library_states[lib].indexing_thread)
 
+            if self._library_states[lib].indexing_worker:
+                cast(
+                    LibraryIndexingWorker, self._library_states[lib].indexing_worker
+                ).cancel()
+
             thread.requestInterruption()
             thread.quit()
             thread.wait()
@@ -199,55 +376,258 @@ class LibraryManager(QObject):
             self._library_states[lib].indexing_thread = None
             self._library_states[lib].indexing_worker = None
 
-    def _indexing_status(self, lib: Library, msg: str) -> None:
-        self._library_states[lib].last_indexing_status = msg
+            self._indexing_scheduler.finished(lib)
+
+            self._set_watcher_paused(lib, False)
+            self._start_updating(lib)
+
+        self._schedule_indexing()
+
+    # starts or stops watching a library, depending on its settings
+
+    def updateWatching(self, lib: Library) -> None:
+
+        state: LibraryState = self._library_states[lib]
+        watch: bool = lib.isWatched() and LibraryWatcher.supportsLibrary(lib)
 
-    def getIndexingStatus(self, lib: Library) -> str:
-        return self._library_states[lib].last_indexing_status
+        if state.watcher and not watch:
+            state.watcher.stop()
+            state.watcher.deleteLater()
+            state.watcher = None
+        elif watch and not state.watcher:
+            state.watcher = LibraryWatcher(lib, parent=self)
+            state.watcher.changed.connect(self._library_changed)
+            state.watcher.start()
+            state.watcher.setPaused(state.indexing_thread is not None)
 
+    def _set_watcher_paused(self, lib: Library, paused: bool) -> None:
+
+        watcher: Optional[LibraryWatcher] = self._library_states[lib].watcher
+
+        if not watcher:
+            return
+
+        if not paused:
+            # the tree might have been replaced in the meantime
+            watcher.refresh()
+
+        watcher.setPaused(paused)
+
+    # only the directories reported by the watcher need to be listed again,
+    # see LibraryIndexingWorker.updateFolderStructure()
+
+    def _library_changed(self, lib: Library, paths: Set[str]) -> None:
+
+        if lib not in self._library_states:
+            return
+
+        self._library_states[lib].update_paths.update(paths)
+        self._start_updating(lib)
+
+    def _start_updating(self, lib: Library) -> None:
+
+        state: LibraryState = self._library_states[lib]
+        thread: QThread
+        worker: LibraryIndexingWorker
+
+        if state.indexing_thread or state.update_thread or not state.update_paths:
+            return
+
+        worker = self._library_indexing_worker_factory(
+            library=lib, paths=set(state.update_paths)
+        )
+        thread = QThread(parent=self)
+
+        state.update_paths.clear()
+
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+
+        worker.result.connect(
+            lambda result: self._receive_update_result(worker, result)
+        )
+
+        state.update_thread = thread
+        state.update_worker = worker
+
+        thread.start()
+
+    def _receive_update_result(
+        self, worker: LibraryIndexingWorker, result: LibraryIndexingResult
+    ) -> None:
+
+        lib: Library = result.library
+
+        # the update was stopped, but finished before noticing
+        if (
+            lib not in self._library_states
+            or worker is not self._library_states[lib].update_worker
+        ):
+            return
+
+        self._library_states[lib].update_thread = None
+        self._library_states[lib].update_worker = None
+
+        if result.tree:
+            self._apply_indexing_result(result)
+
+        # the tree changed, and so did the directories to watch
+        if self._library_states[lib].watcher:
+            cast(LibraryWatcher, self._library_states[lib].watcher).refresh()
+
+        self._start_updating(lib)
+
+    def _stop_updating(self, lib: Library) -> None:
+
+        state: LibraryState = self._library_states[lib]
+
+        if not state.update_thread:
+            return
+
+        if state.update_worker:
+            state.update_worker.cancel()
+
+        state.update_thread.requestInterruption()
+        state.update_thread.quit()
+        state.update_thread.wait()
+
+        state.update_thread = None
+        state.update_worker = None
+
+    def _indexing_progress(
+        self, lib: Library, progress: LibraryIndexingProgress
+    ) -> None:
+
+        if lib not in self._library_states:
+            return
+
+        self._library_states[lib].indexing_progress = progress
+
+    def getIndexingStatus(self, lib: Library) -> LibraryIndexingProgress:
+        return self._library_states[lib].indexing_progress
+
+    # queued libraries count as being indexed as well
     def isIndexing(self, lib: Library) -> bool:
-        return self._library_states[lib].indexing_thread is not None
+        return self._library_states[
+            lib
+        ].indexing_thread is not None or self._indexing_scheduler.isQueued(lib)
+
+    def isIndexingQueued(self, lib: Library) -> bool:
+        return self._indexing_scheduler.isQueued(lib)
 
     def unload(self) -> None:
 
+        lib: Library
+        state: LibraryState
+        worker: LibrarySaverWorker
+
+        # libraries which weren't loaded yet didn't change either
+        if self._loader_thread:
+            if self._loader_worker:
+                self._loader_worker.cancel()
+            self._loader_thread.requestInterruption()
+            self._loader_thread.quit()
+            self._loader_thread.wait()
+            self._loader_thread = None
+            self._loader_worker = None
+
         self.abortIndexing()
 
         for lib in self._libraries:
             if lib not in self._library_states:
                 continue
 
-            if self._library_states[lib].saver_thread:
-                thread = cast(QThread, self._library_states[lib].saver_thread)
-                thread.requestInterruption()
-                thread.quit()
-                thread.wait()
+            state = self._library_states[lib]
+
+            if state.watcher:
+                state.watcher.stop()
+
+            self._stop_updating(lib)
+
+            if state.save_timer:
+                state.save_timer.stop()
+
+            # running saves are finished, not cancelled,
+            # since they might be the last chance for their changes
+            if state.saver_thread:
+                state.saver_thread.quit()
+                state.saver_thread.wait()
+                state.saver_thread = None
+                state.saver_worker = None
 
-                self._library_states[lib].saver_thread = None
-                self._library_states[lib].saver_worker = None
+            if state.save_pending:
+                state.save_pending = False
+                worker = self._library_saver_worker_factory(library=lib)
+                worker.run()
+
+    # saves the library soon, see above
 
     def save(self, lib: Library) -> None:
 
-        if self._library_states[lib].saver_thread:
+        state: LibraryState = self._library_states[lib]
+
+        state.save_pending = True
+
+        # the library will be saved again once the running save finished
+        if state.saver_thread:
+            return
+
+        if not state.save_timer:
+            state.save_timer = QTimer(self)
+            state.save_timer.setSingleShot(True)
+            state.save_timer.setInterval(SAVE_DELAY)
+            state.save_timer.timeout.connect(lambda: self._start_saving(lib))
+
+        # restarting the timer on every request could delay saving forever
+        if not state.save_timer.isActive():
+            state.save_timer.start()
+
+    def _start_saving(self, lib: Library) -> None:
+
+        state: LibraryState
+        thread: QThread
+        worker: LibrarySaverWorker
+
+        if lib not in self._library_states:
             return
 
-        worker: LibrarySaverWorker = self._library_saver_worker_factory(library=lib)
-        thread: QThread = QThread(parent=self)
+        state = self._library_states[lib]
+
+        if state.saver_thread or not state.save_pending:
+            return
+
+        state.save_pending = False
+
+        worker = self._library_saver_worker_factory(library=lib)
+        thread = QThread(parent=self)
 
         worker.moveToThread(thread)
 
         thread.started.connect(worker.run)
-        worker.finished.connect(thread.quit)
+        # directly, so that unload() is able to wait for the thread
+        # without processing events
+        worker.finished.connect(thread.quit, Qt.DirectConnection)
         worker.finished.connect(worker.deleteLater)
         thread.finished.connect(thread.deleteLater)
 
         worker.finished.connect(lambda: self._saver_finished(lib))
 
-        self._library_states[lib].saver_thread = thread
-        self._library_states[lib].saver_worker = worker
+        state.saver_thread = thread
+        state.saver_worker = worker
 
         thread.start()
 
     def _saver_finished(self, lib: Library) -> None:
 
+        if lib not in self._library_states:
+            return
+
         self._library_states[lib].saver_thread = None
         self._library_states[lib].saver_worker = None
+
+        if self._library_states[lib].save_pending:
+            self.save(lib)
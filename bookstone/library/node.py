@@ -1,40 +1,138 @@
-import posixpath
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterator, List, Optional, Union
+import sys
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from itertools import chain
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 NODE_DIRECTORY = 0
 NODE_FILE = 1
 
+EPOCH: datetime = datetime.fromtimestamp(0, timezone.utc)
+MICROSECOND: timedelta = timedelta(microseconds=1)
+
+# files can't have children, so they all share this one
+# instead of carrying an empty dictionary each
+# it must never be modified
+_NO_CHILDREN: Dict[str, "Node"] = {}
+
+
+class TraversalOrder(Enum):
+
+    pre = 0  # parents before their children
+    post = 1  # children before their parents
+
+
+# trees of large libraries consist of hundreds of thousands of nodes,
+# so nodes are kept as small as possible:
+# no instance dictionaries, modification times as integer epoch microseconds
+# and names interned, since most file names (01.mp3, ...) repeat throughout
+# the tree
+# paths of directories are cached once computed, and the root of a tree keeps
+# an index of all directories by path, so that looking up a full path doesn't
+# need any string work per level
+# a directory only has a cached path if all its ancestors have one as well,
+# so that invalidating can stop at the first directory without one
+# the index is built when a tree is searched for a nested path for the first time
+# directories also carry aggregates of all files below them (their amount,
+# total size and newest modification time), which are kept up to date by
+# propagating every change to the ancestors, so that the size of a book or
+# library is known without walking it
+
 
 class Node:
 
+    __slots__ = (
+        "_children",
+        "_file_count",
+        "_modification_time",
+        "_name",
+        "_newest_modification_time",
+        "_parent",
+        "_path",
+        "_path_index",
+        "_size",
+        "_total_size",
+        "_type",
+    )
+
     _children: Dict[str, "Node"]
-    _modification_time: datetime
+    _file_count: int
+    _modification_time: int
     _name: str
+    _newest_modification_time: int
     _parent: Optional["Node"]
+    _path: Optional[str]
+    _path_index: Optional[Dict[str, "Node"]]
     _size: int
+    _total_size: int
     _type: int
 
     def __init__(self, name: str = "", parent: Optional["Node"] = None) -> None:
 
-        self._name = name
+        self._name = sys.intern(name)
         self._type = NODE_DIRECTORY
         self._children = {}
         self._parent = parent
+        self._path = None
+        self._path_index = None
         self._size = -1
-        self._modification_time = datetime.fromtimestamp(0, timezone.utc)
+        self._modification_time = 0
+        self._file_count = 0
+        self._total_size = 0
+        self._newest_modification_time = 0
 
     def setName(self, name: str) -> None:
+
+        index: Optional[Dict[str, Node]]
+        name = sys.intern(name)
+
+        if name == self._name:
+            return
+
+        index = self._get_path_index()
+
+        if index is not None:
+            self._remove_from_index(index)
+
+        if self._parent is not None and self._parent._children.get(self._name) is self:
+            del self._parent._children[self._name]
+            self._parent._children[name] = self
+
         self._name = name
+        self._invalidate_paths()
+
+        if index is not None:
+            self._add_to_index(index)
 
     def getName(self) -> str:
         return self._name
 
     def setDirectory(self) -> None:
-        self._type = NODE_DIRECTORY
+
+        aggregates: Tuple[int, int, int]
+
+        if self._type != NODE_DIRECTORY:
+            aggregates = self._get_aggregates()
+            self._children = {}
+            self._type = NODE_DIRECTORY
+            # only directories are indexed
+            self.getRoot()._path_index = None
+            self._update_parent_aggregates(aggregates)
 
     def setFile(self) -> None:
-        self._type = NODE_FILE
+
+        aggregates: Tuple[int, int, int]
+
+        if self._children:
+            raise IOError(f"{self} cannot become a file: it still has children")
+
+        if self._type != NODE_FILE:
+            aggregates = self._get_aggregates()
+            self._type = NODE_FILE
+            self._children = _NO_CHILDREN
+            self._path = None
+            self.getRoot()._path_index = None
+            self._update_parent_aggregates(aggregates)
 
     def isDirectory(self) -> bool:
         return self._type == NODE_DIRECTORY
@@ -54,17 +152,96 @@ class Node:
                 )
             )
 
-        if self.findChild(child):
+        if child.getName() in self._children:
             raise ValueError(f"a child {child} for {self} already exists")
 
+        index: Optional[Dict[str, Node]] = self._get_path_index()
+
         child.setParent(self)
         self._children[child.getName()] = child
 
+        if index is not None:
+            child._add_to_index(index)
+
+        self._propagate_aggregates((0, 0, 0), child._get_aggregates())
+
+    # adds a child which belongs to another tree without taking it over,
+    # so that both trees share the subtree instead of copying it and the
+    # other tree isn't modified at all
+    # this is how a new version of a tree takes over unchanged directories
+    # from the previous one, which is why the child has to be located at the
+    # same path within both trees: paths of shared nodes are still built
+    # through their parents within the other tree
+    # shared subtrees mustn't be modified until the new tree took them over
+    # with adoptSharedChildren()
+
+    def addSharedChild(self, child: "Node") -> None:
+
+        if self.isFile():
+            raise IOError(
+                "trying to add child {child} to parent {parent}: files cannot have children".format(
+                    child=child, parent=self
+                )
+            )
+
+        if child.getName() in self._children:
+            raise ValueError(f"a child {child} for {self} already exists")
+
+        other_parent: Optional[Node] = child.getParent()
+
+        if other_parent is None or other_parent.getPath() != self.getPath():
+            raise ValueError(f"{child} cannot be shared with {self}: paths differ")
+
+        index: Optional[Dict[str, Node]] = self._get_path_index()
+
+        self._children[child.getName()] = child
+
+        if index is not None:
+            child._add_to_index(index)
+
+        self._propagate_aggregates((0, 0, 0), child._get_aggregates())
+
+    # adds a child without any of the bookkeeping addChild() does,
+    # for building new trees in bulk
+    # the aggregates need to be calculated once the tree is complete
+
+    def _attach_child(self, child: "Node") -> None:
+
+        child._parent = self
+        self._children[child._name] = child
+
+    # makes this tree the owner of all subtrees it shares with another tree,
+    # which mustn't be used anymore afterwards
+    # only nodes which aren't shared need to be visited, so this takes time
+    # proportional to the parts of the tree which were created anew
+
+    def adoptSharedChildren(self) -> None:
+
+        child: Node
+        node: Node
+        stack: List[Node] = [self]
+
+        while stack:
+
+            node = stack.pop()
+
+            for child in node._children.values():
+
+                if child._parent is not node:
+                    # the paths are the same within both trees,
+                    # so the cached ones stay valid
+                    child._parent = node
+                elif child._type == NODE_DIRECTORY:
+                    stack.append(child)
+
     def getParent(self) -> Optional["Node"]:
         return self._parent
 
     def setParent(self, parent: Optional["Node"]) -> None:
+
         self._parent = parent
+        self._path_index = None
+        self._invalidate_paths()
 
     def getRoot(self) -> "Node":
 
@@ -80,110 +257,341 @@ class Node:
 
     def getPath(self) -> str:
 
-        path: str = self._name
-        current: Optional["Node"] = self._parent
+        if self._path is not None:
+            return self._path
 
-        while current:
+        # usually the parent knows its path already
+        if self._parent is not None and self._parent._path is not None:
+            return self._join_path(self._parent._path)
 
-            if current._name != "":
-                path = current._name + "/" + path
+        node: Node
+        path: str = ""
+        uncached: List[Node] = []
+        current: Optional[Node] = self
 
+        # walk up to the first ancestor which knows its path
+        while current is not None and current._path is None:
+            uncached.append(current)
             current = current._parent
 
+        if current is not None:
+            path = current._path or ""
+
+        for node in reversed(uncached):
+            path = node._join_path(path)
+
         return path
 
+    def _join_path(self, parent_path: str) -> str:
+
+        path: str
+
+        if parent_path == "" or self._name == "":
+            path = parent_path + self._name
+        else:
+            path = parent_path + "/" + self._name
+
+        if self._type == NODE_DIRECTORY:
+            self._path = path
+
+        return path
+
+    def _invalidate_paths(self) -> None:
+
+        node: Node
+        stack: List[Node] = [self]
+
+        if self._path is None and self._type == NODE_FILE:
+            return
+
+        while stack:
+
+            node = stack.pop()
+
+            if node._path is None and node is not self:
+                continue
+
+            node._path = None
+            stack.extend(
+                c for c in node._children.values() if c._type == NODE_DIRECTORY
+            )
+
+    def _get_path_index(self) -> Optional[Dict[str, "Node"]]:
+        return self.getRoot()._path_index
+
+    # adds this node and all directories below it to index
+    # only methods are used on the nodes, since subtrees shared with
+    # read-only trees are made of ColumnarNodes
+
+    def _add_to_index(self, index: Dict[str, "Node"]) -> None:
+
+        node: Node
+        stack: List[Node] = [self]
+
+        while stack:
+
+            node = stack.pop()
+
+            if not node.isDirectory():
+                continue
+
+            index[node.getPath()] = node
+            stack.extend(node._iter_children())
+
+    def _remove_from_index(self, index: Dict[str, "Node"]) -> None:
+
+        node: Node
+        path: str
+        stack: List[Node] = [self]
+
+        while stack:
+
+            node = stack.pop()
+
+            if not node.isDirectory():
+                continue
+
+            path = node.getPath()
+
+            # nodes of columnar trees are views created anew on every access,
+            # so nodes are compared by their paths
+            if index.get(path) == node:
+                del index[path]
+
+            stack.extend(node._iter_children())
+
+    # trees are (de)serialized without recursion, since libraries can be nested
+    # deeper than the recursion limit
+
     def serialize(self) -> Dict[str, Any]:
 
-        child: "Node"
+        child: Node
+        child_ser: Dict[str, Any]
+        node: Node
+        node_ser: Dict[str, Any]
+        ser: Dict[str, Any] = self._serialize_attributes()
+        stack: List[Tuple[Node, Dict[str, Any]]] = [(self, ser)]
+
+        while stack:
+
+            node, node_ser = stack.pop()
+
+            for child in node._children.values():
+
+                child_ser = child._serialize_attributes()
+                node_ser["children"].append(child_ser)
+
+                if child._children:
+                    stack.append((child, child_ser))
+
+        return ser
+
+    def _serialize_attributes(self) -> Dict[str, Any]:
+
         ser: Dict[str, Any] = {
             "name": self._name,
             "type": self._type,
-            "mtime": self._modification_time.isoformat(),
+            "mtime": self.getModificationTime().isoformat(),
             "children": [],
         }
 
         if self.isFile():
             ser["size"] = self._size
 
-        for child in self._children.values():
-            ser["children"].append(child.serialize())
-
         return ser
 
     def deserialize(self, serialized: Dict[str, Any]) -> None:
 
+        aggregates: Tuple[int, int, int]
         child: Dict[str, Any]
+        node: Node
+        node_ser: Dict[str, Any]
+        parent: Node
+        stack: List[Tuple[Node, Dict[str, Any]]] = [(self, serialized)]
 
         self.removeAllChildren()
-        self._name = serialized.get("name", "")
-        self._type = serialized.get("type", "")
-        self._modification_time = datetime.fromisoformat(
-            serialized.get("mtime", datetime.fromtimestamp(0, timezone.utc).isoformat())
+        self.setName(serialized.get("name", ""))
+
+        if serialized.get("type", NODE_DIRECTORY) == NODE_FILE:
+            self.setFile()
+        else:
+            self.setDirectory()
+
+        aggregates = self._get_aggregates()
+        self._deserialize_attributes(serialized)
+
+        while stack:
+
+            parent, node_ser = stack.pop()
+
+            if parent.isFile():
+                continue
+
+            for child in node_ser.get("children", []):
+
+                node = Node(child.get("name", ""))
+
+                if child.get("type", NODE_DIRECTORY) == NODE_FILE:
+                    node._type = NODE_FILE
+                    node._children = _NO_CHILDREN
+
+                node._deserialize_attributes(child)
+                parent._attach_child(node)
+
+                stack.append((node, child))
+
+        self.getRoot()._path_index = None
+
+        # nodes were added directly, so their aggregates are calculated at once
+        self._calculate_aggregates()
+        self._update_parent_aggregates(aggregates)
+
+    def _deserialize_attributes(self, serialized: Dict[str, Any]) -> None:
+
+        self.setModificationTime(
+            datetime.fromisoformat(serialized.get("mtime", EPOCH.isoformat()))
         )
 
         if self.isFile():
             self._size = serialized.get("size", -1)
 
-        children: List[Dict[str, Any]] = serialized.get("children", [])
+    # returns the path of location relative to this node,
+    # or None if location isn't below this node
 
-        for child in children:
+    def _get_relative_path(self, location: Union["Node", str]) -> Optional[str]:
 
-            node: "Node" = Node()
-            node.deserialize(child)
-            node.setParent(self)
-            self._children[node.getName()] = node
+        location_path: str
+        self_path: str
 
-    def findChild(self, location: Union["Node", str]) -> Optional["Node"]:
+        if isinstance(location, str):
 
-        self_path = self.getPath()
-        path: str
+            if location.startswith("/"):
+                return location[1:]
 
-        if isinstance(location, Node):
-            location_path = location.getPath()
-            try:
-                # if we're checking at root level and two nested folders are named exactly the same way
-                # the algorithm thinks that they are the same
-                # compare a Node abc with a Node abc fails, because they are called the same
-                # but we are meant to check for children only
-                if location_path == self_path:
-                    path = location_path
-                else:
-                    path = posixpath.relpath(location_path, self_path)
-            except ValueError:
-                if self_path == "":
-                    path = location_path
-                else:
-                    # paths do not overlap -> child is not in that part of the tree
-                    return None
-        elif isinstance(location, str):
-            path = location
-
-            if path.startswith("/"):
-                path = path[1:]
-        else:
+            return location
+
+        if not isinstance(location, Node):
             raise NotImplementedError()
 
+        location_path = location.getPath()
+        self_path = self.getPath()
+
+        # if we're checking at root level and two nested folders are named exactly the same way
+        # the algorithm thinks that they are the same
+        # compare a Node abc with a Node abc fails, because they are called the same
+        # but we are meant to check for children only
+        if self_path == "" or location_path == self_path:
+            return location_path
+
+        if location_path.startswith(self_path + "/"):
+            return location_path[len(self_path) + 1 :]
+
+        # paths do not overlap -> child is not in that part of the tree
+        return None
+
+    def findChild(self, location: Union["Node", str]) -> Optional["Node"]:
+
+        full_path: str
+        index: Dict[str, Node]
+        name: str
+        node: Optional[Node]
+        parent_path: str
+        path: Optional[str] = self._get_relative_path(location)
+        root: Node
+        self_path: str
+
+        if path is None:
+            return None
+
         if path == "":
             return self
 
-        parts: List[str] = path.split("/")
-        child_name: str = parts[0]
+        if "/" not in path:
+            return self._children.get(path, None)
 
-        child: Optional["Node"] = self._children.get(child_name, None)
+        root = self.getRoot()
 
-        if child:
-            if len(parts) == 1:
-                return child
-            else:
-                return child.findChild(posixpath.join(*parts[1:]))
+        # the index is only published once complete, since trees may be
+        # searched by other threads as well (e.g. the indexing worker
+        # looking for unchanged directories)
+        if root._path_index is None:
+            index = {}
+            root._add_to_index(index)
+            root._path_index = index
 
-        return None
+        self_path = self.getPath()
+        full_path = path if self_path == "" else self_path + "/" + path
+
+        node = root._path_index.get(full_path, None)
+
+        if node is not None:
+            return node
+
+        # files aren't indexed, but their parents are
+        parent_path, _, name = full_path.rpartition("/")
+        node = root._path_index.get(parent_path, None)
+
+        if node is None:
+            return None
+
+        return node._children.get(name, None)
+
+    # iterates over all nodes below this one, together with their depth
+    # relative to this node (its children have depth 1)
+    # max_depth: don't descend any further than this, 0 means no limit
+    # prune: called for every directory, returning True won't descend into it
+    # the tree must not be modified while being walked
+
+    def walk(
+        self,
+        order: TraversalOrder = TraversalOrder.pre,
+        max_depth: int = 0,
+        prune: Optional[Callable[["Node", int], bool]] = None,
+    ) -> Iterator[Tuple["Node", int]]:
+
+        child: Optional[Node]
+        children: Iterator[Node]
+        depth: int
+        node: Node
+        stack: List[Tuple[Node, Iterator[Node], int]] = [
+            (self, self._iter_children(), 1)
+        ]
+
+        while stack:
+
+            node, children, depth = stack[-1]
+            child = next(children, None)
+
+            if child is None:
+
+                stack.pop()
+
+                if order == TraversalOrder.post and node is not self:
+                    yield (node, depth - 1)
+
+                continue
+
+            if order == TraversalOrder.pre:
+                yield (child, depth)
+
+            if (
+                child.isDirectory()
+                and (max_depth == 0 or depth < max_depth)
+                and (prune is None or not prune(child, depth))
+            ):
+                stack.append((child, child._iter_children(), depth + 1))
+            elif order == TraversalOrder.post:
+                yield (child, depth)
+
+    def _iter_children(self) -> Iterator["Node"]:
+        return iter(self._children.values())
 
     # depth = 0: return all children
     # depth > 0: return only children with a depth level given by depth
     # files: return files
     # dirs: return directories
     # files and dirs allow proper filtering of the iterated children
+    # directories are never returned for depth = 0
 
     def iterChildren(
         self,
@@ -193,19 +601,17 @@ class Node:
     ) -> Iterator["Node"]:
 
         child: Node
+        child_depth: int
+
+        for child, child_depth in self.walk(max_depth=depth):
 
-        for child in list(self._children.values()):
+            if depth != 0 and child_depth != depth:
+                continue
 
-            if depth > 1:
-                yield from child.iterChildren(depth=depth - 1, files=files, dirs=dirs)
-            elif depth == 1:
-                if (dirs and child.isDirectory()) or (files and child.isFile()):
-                    yield child
-            elif depth == 0:
-                if files and child.isFile():
-                    yield child
-                elif child.isDirectory():
-                    yield from child.iterChildren(depth=0, files=files, dirs=dirs)
+            if (files and child.isFile()) or (
+                depth != 0 and dirs and child.isDirectory()
+            ):
+                yield child
 
     def __str__(self) -> str:
 
@@ -228,29 +634,69 @@ class Node:
         if child.getName() not in self._children:
             return
 
+        index: Optional[Dict[str, Node]] = self._get_path_index()
+
+        if index is not None:
+            child._remove_from_index(index)
+
         del self._children[child.getName()]
 
+        self._propagate_aggregates(child._get_aggregates(), (0, 0, 0))
+
         child.setParent(None)
 
         child.removeAllChildren()
 
     def removeAllChildren(self) -> None:
 
-        child: "Node"
+        if not self._children:
+            return
+
+        aggregates: Tuple[int, int, int] = self._get_aggregates()
+        index: Optional[Dict[str, Node]] = self._get_path_index()
+        node: Node
+        stack: List[Node] = list(self._children.values())
 
-        for child in self._children.values():
-            child.setParent(None)
-            child.removeAllChildren()
+        if index is not None:
+            for node in stack:
+                node._remove_from_index(index)
 
         self._children.clear()
+        self._file_count = 0
+        self._total_size = 0
+        self._newest_modification_time = 0
+        self._update_parent_aggregates(aggregates)
+
+        while stack:
+
+            node = stack.pop()
+            node._parent = None
+            node._path = None
+
+            if node._children:
+                stack.extend(node._children.values())
+                node._children.clear()
 
     def getModificationTime(self) -> datetime:
 
-        return self._modification_time
+        if self._modification_time == 0:
+            return EPOCH
+
+        return EPOCH + self._modification_time * MICROSECOND
 
     def setModificationTime(self, time: datetime) -> None:
 
-        self._modification_time = time
+        aggregates: Tuple[int, int, int] = self._get_aggregates()
+
+        # naive times are local times, just like datetime.timestamp() assumes
+        if time.tzinfo is None:
+            time = time.astimezone(timezone.utc)
+
+        self._modification_time = (time - EPOCH) // MICROSECOND
+
+        # only the modification times of files are aggregated
+        if self._type == NODE_FILE:
+            self._update_parent_aggregates(aggregates)
 
     def getSize(self) -> int:
 
@@ -264,10 +710,110 @@ class Node:
         if not self.isFile():
             raise IOError("{node} is not a file".format(node=self))
 
+        aggregates: Tuple[int, int, int] = self._get_aggregates()
+
         self._size = size
+        self._update_parent_aggregates(aggregates)
+
+    # the amount of files below this directory, or 1 for a file
+
+    def getFileCount(self) -> int:
+        return self._get_aggregates()[0]
+
+    # the total size of all files below this directory, or the size of a file
+
+    def getTotalSize(self) -> int:
+        return self._get_aggregates()[1]
+
+    # the newest modification time of all files below this directory,
+    # or the modification time of a file
+
+    def getNewestModificationTime(self) -> datetime:
+        return EPOCH + self._get_aggregates()[2] * MICROSECOND
+
+    # file count, total size and newest modification time
+    # files are their own aggregates, files without a size don't count into it
+
+    def _get_aggregates(self) -> Tuple[int, int, int]:
+
+        if self._type == NODE_FILE:
+            return (1, max(self._size, 0), self._modification_time)
+
+        return (self._file_count, self._total_size, self._newest_modification_time)
+
+    def _update_parent_aggregates(self, before: Tuple[int, int, int]) -> None:
+        if self._parent is not None:
+            self._parent._propagate_aggregates(before, self._get_aggregates())
+
+    # applies the change of the aggregates of a child from before to after
+    # to this node and all its ancestors
+    # sizes and counts are simply adjusted, but if the newest file got
+    # older or removed, the newest one among the children has to be searched
+
+    def _propagate_aggregates(
+        self, before: Tuple[int, int, int], after: Tuple[int, int, int]
+    ) -> None:
+
+        count: int = after[0] - before[0]
+        newest_after: int = after[2]
+        newest_before: int = before[2]
+        node: Optional[Node] = self
+        previous: int
+        size: int = after[1] - before[1]
+
+        while node is not None and (
+            count != 0 or size != 0 or newest_before != newest_after
+        ):
+
+            node._file_count += count
+            node._total_size += size
+            previous = node._newest_modification_time
+
+            if newest_after > previous:
+                node._newest_modification_time = newest_after
+            elif newest_before == previous and newest_after < previous:
+                node._newest_modification_time = max(
+                    (c._get_aggregates()[2] for c in node._children.values()),
+                    default=0,
+                )
+
+            newest_before = previous
+            newest_after = node._newest_modification_time
+            node = node._parent
+
+    # recalculates the aggregates of all directories below and including this
+    # node from scratch, children before their parents
+
+    def _calculate_aggregates(self) -> None:
+
+        child: Node
+        count: int
+        newest: int
+        node: Node
+        size: int
+
+        for node in chain((n for n, _ in self.walk(TraversalOrder.post)), [self]):
+
+            if node._type != NODE_DIRECTORY:
+                continue
+
+            node._file_count = 0
+            node._total_size = 0
+            node._newest_modification_time = 0
+
+            for child in node._children.values():
+
+                count, size, newest = child._get_aggregates()
+
+                node._file_count += count
+                node._total_size += size
+
+                if newest > node._newest_modification_time:
+                    node._newest_modification_time = newest
 
     def isParentOf(self, child: Union["Node", str]) -> bool:
 
+        own_path: str
         path: str
 
         if isinstance(child, str):
@@ -280,7 +826,16 @@ class Node:
                 return False
             return True
 
-        return path.startswith(self.getPath())
+        own_path = self.getPath()
+
+        # whole names only, books/a isn't a parent of books/ab
+        return path == own_path or path.startswith(own_path + "/")
+
+    # whether both are the very same node, e.g. because a tree shares it
+    # with another one
+
+    def isSameNode(self, node: "Node") -> bool:
+        return self is node
 
     def __eq__(self, node: Any) -> bool:
 
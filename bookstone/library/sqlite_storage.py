@@ -0,0 +1,411 @@
+import json
+import os
+import posixpath
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .book import Book
+from .columnar_tree import COLUMNAR_TREE_THRESHOLD, compactTree
+from .library import Library, LibraryChanges
+from .node import EPOCH, MICROSECOND, NODE_DIRECTORY, NODE_FILE, Node
+
+LIBRARY_DATABASE_VERSION: int = 1
+
+_SCHEMA: List[str] = [
+    "CREATE TABLE IF NOT EXISTS metadata "
+    "(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS books "
+    "(path TEXT PRIMARY KEY, uuid TEXT NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS tags "
+    "(book TEXT NOT NULL REFERENCES books (path) ON DELETE CASCADE, "
+    "name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (book, name)) "
+    "WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS nodes "
+    "(path TEXT PRIMARY KEY, type INTEGER NOT NULL, size INTEGER NOT NULL, "
+    "modification_time INTEGER NOT NULL) WITHOUT ROWID",
+]
+
+# every node is stored by its path, so that changed nodes can be written
+# without knowing anything about the rest of the tree
+# the descendants of a node are all paths between path + "/" and path + "0",
+# since "0" is the character following "/"
+_SUBTREE: str = "path = ? OR (path >= ? AND path < ?)"
+
+# amount of books or nodes written between two calls to check
+_CHECK_INTERVAL: int = 4096
+
+
+# stores a library within an SQLite database
+# other than the binary storage, only the parts of a library which changed
+# since it was last saved are written, each save being a single transaction
+# the database runs in WAL mode, so that those small writes don't need to
+# rewrite anything but the pages they touch
+
+
+def _connect(file_name: str) -> sqlite3.Connection:
+
+    connection: sqlite3.Connection = sqlite3.connect(file_name)
+
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = ON")
+
+    return connection
+
+
+def _node_row(path: str, node: Node) -> Tuple[str, int, int, int]:
+    return (
+        path,
+        NODE_FILE if node.isFile() else NODE_DIRECTORY,
+        node.getSize() if node.isFile() else 0,
+        (node.getModificationTime() - EPOCH) // MICROSECOND,
+    )
+
+
+# the rows of a node and everything below it
+# paths are built while walking, which is a lot cheaper than asking every
+# node for its path
+
+
+def _iter_node_rows(
+    node: Node, check: Callable[[], None]
+) -> Iterator[Tuple[str, int, int, int]]:
+
+    child: Node
+    count: int = 0
+    depth: int
+    path: str = node.getPath()
+    paths: List[str] = [path]
+
+    yield _node_row(path, node)
+
+    for child, depth in node.walk():
+
+        del paths[depth:]
+
+        if paths[-1] == "":
+            path = child.getName()
+        else:
+            path = paths[-1] + "/" + child.getName()
+
+        paths.append(path)
+
+        yield _node_row(path, child)
+
+        count += 1
+
+        if count % _CHECK_INTERVAL == 0:
+            check()
+
+
+def _write_metadata(connection: sqlite3.Connection, lib: Library) -> None:
+
+    connection.executemany(
+        "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+        [(k, json.dumps(v)) for k, v in lib.serializeMetadata().items()],
+    )
+
+
+def _write_book(connection: sqlite3.Connection, book: Book) -> None:
+
+    connection.execute(
+        "INSERT INTO books (path, uuid) VALUES (?, ?) "
+        "ON CONFLICT (path) DO UPDATE SET uuid = excluded.uuid",
+        (book.path, book.uuid),
+    )
+    connection.execute("DELETE FROM tags WHERE book = ?", (book.path,))
+    connection.executemany(
+        "INSERT INTO tags (book, name, value) VALUES (?, ?, ?)",
+        [(book.path, n, v) for n, v in book.tags.serialize().items()],
+    )
+
+
+def _write_subtree(
+    connection: sqlite3.Connection, root: Node, path: str, check: Callable[[], None]
+) -> None:
+
+    node: Optional[Node] = root if path == "" else root.findChild(path)
+
+    if path == "":
+        connection.execute("DELETE FROM nodes")
+    else:
+        connection.execute(
+            f"DELETE FROM nodes WHERE {_SUBTREE}", (path, path + "/", path + "0")
+        )
+
+    if node is not None:
+        connection.executemany(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)",
+            _iter_node_rows(node, check),
+        )
+
+
+def _write_everything(
+    connection: sqlite3.Connection, lib: Library, check: Callable[[], None]
+) -> None:
+
+    book: Book
+    i: int
+
+    connection.execute("DELETE FROM metadata")
+    connection.execute("DELETE FROM tags")
+    connection.execute("DELETE FROM books")
+
+    _write_metadata(connection, lib)
+
+    for i, book in enumerate(lib.getBooks()):
+
+        _write_book(connection, book)
+
+        if i % _CHECK_INTERVAL == 0:
+            check()
+
+    _write_subtree(connection, lib.getTree(), "", check)
+
+
+def _is_within(path: str, paths: Set[str]) -> bool:
+
+    while path:
+
+        if path in paths:
+            return True
+
+        path = posixpath.dirname(path)
+
+    return "" in paths
+
+
+def _write_changes(
+    connection: sqlite3.Connection,
+    lib: Library,
+    changes: LibraryChanges,
+    check: Callable[[], None],
+) -> None:
+
+    book: Optional[Book]
+    node: Optional[Node]
+    path: str
+    root: Node
+    written: Set[str] = set()
+
+    if changes.metadata:
+        _write_metadata(connection, lib)
+
+    for path in changes.books:
+
+        book = lib.findBook(path)
+
+        if book is None:
+            connection.execute("DELETE FROM books WHERE path = ?", (path,))
+        else:
+            _write_book(connection, book)
+
+    if not (changes.tree or changes.subtrees or changes.nodes):
+        return
+
+    # the tree has been loaded already if it changed
+    root = lib.getTree()
+
+    if changes.tree:
+        _write_subtree(connection, root, "", check)
+        return
+
+    # subtrees within subtrees which were written already are skipped,
+    # parents sort before their children
+    for path in sorted(changes.subtrees):
+
+        if _is_within(path, written):
+            continue
+
+        _write_subtree(connection, root, path, check)
+        written.add(path)
+
+    # the root isn't part of any diff, but its modification time changes
+    # whenever something directly inside it does
+    for path in changes.nodes | {""}:
+
+        node = root if path == "" else root.findChild(path)
+
+        if node is not None:
+            connection.execute(
+                "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)",
+                _node_row(path, node),
+            )
+
+
+# writes all changes of the library into the database at file_name
+# the whole library is written if the database doesn't exist yet
+# or if nothing is known about what it contains
+# check is called every now and then while writing and may raise to stop,
+# nothing will be written in that case
+
+
+def writeLibrary(
+    lib: Library,
+    file_name: str,
+    changes: LibraryChanges,
+    check: Optional[Callable[[], None]] = None,
+) -> None:
+
+    connection: sqlite3.Connection
+    exists: bool = os.path.exists(file_name)
+
+    # a tree which isn't loaded yet might need to be read from this database
+    if changes.everything or not exists:
+        lib.getTree()
+
+    connection = _connect(file_name)
+
+    try:
+
+        with connection:
+
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+            connection.execute(f"PRAGMA user_version = {LIBRARY_DATABASE_VERSION}")
+
+            if changes.everything or not exists:
+                _write_everything(connection, lib, check or (lambda: None))
+            else:
+                _write_changes(connection, lib, changes, check or (lambda: None))
+
+    finally:
+        connection.close()
+
+
+def _open(file_name: str) -> sqlite3.Connection:
+
+    connection: sqlite3.Connection
+    version: int
+
+    if not os.path.exists(file_name):
+        raise ValueError(f"{file_name} doesn't exist")
+
+    try:
+
+        connection = _connect(file_name)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+    except sqlite3.DatabaseError:
+        raise ValueError(f"{file_name} is not a library database")
+
+    if version != LIBRARY_DATABASE_VERSION:
+        connection.close()
+        raise ValueError(f"{file_name} is not a supported library database")
+
+    return connection
+
+
+def _read_tree(connection: sqlite3.Connection, threshold: int) -> Node:
+
+    directories: Dict[str, Node] = {}
+    modification_time: int
+    node: Node
+    node_type: int
+    parent: Optional[Node]
+    path: str
+    root: Node = Node()
+    size: int
+
+    # parents sort before their children
+    for path, node_type, size, modification_time in connection.execute(
+        "SELECT path, type, size, modification_time FROM nodes ORDER BY path"
+    ):
+
+        if path == "":
+            node = root
+        else:
+
+            parent = directories.get(posixpath.dirname(path))
+
+            if parent is None:
+                raise ValueError(f"node {path} has no parent")
+
+            node = Node(posixpath.basename(path))
+            parent._attach_child(node)
+
+        if node_type == NODE_FILE:
+            node.setFile()
+            node.setSize(size)
+        else:
+            directories[path] = node
+
+        node.setModificationTime(EPOCH + modification_time * MICROSECOND)
+
+    root._calculate_aggregates()
+
+    return compactTree(root, threshold)
+
+
+# reads a library written by writeLibrary()
+# the tree is only read once it is needed if tree is False,
+# which allows for showing all books without waiting for possibly huge trees
+# raises ValueError if the file isn't a valid library database
+
+
+def readLibrary(
+    file_name: str, tree: bool = True, threshold: int = COLUMNAR_TREE_THRESHOLD
+) -> Library:
+
+    book: Book
+    connection: sqlite3.Connection = _open(file_name)
+    lib: Library = Library()
+    metadata: Dict[str, Any]
+    name: str
+    path: str
+    tags: Dict[str, Dict[str, str]] = {}
+    uuid: str
+    value: str
+
+    try:
+
+        metadata = {
+            k: json.loads(v)
+            for k, v in connection.execute("SELECT key, value FROM metadata")
+        }
+
+        lib.deserialize(metadata)
+
+        for path, name, value in connection.execute(
+            "SELECT book, name, value FROM tags"
+        ):
+            tags.setdefault(path, {})[name] = value
+
+        for path, uuid in connection.execute("SELECT path, uuid FROM books"):
+
+            book = Book()
+            book.deserialize({"path": path, "uuid": uuid, "tags": tags.get(path, {})})
+
+            lib.addBook(book)
+
+        if tree:
+            lib.setTree(_read_tree(connection, threshold))
+        else:
+            lib.setTreeLoader(lambda: readTree(file_name, threshold))
+
+    except (sqlite3.DatabaseError, ValueError, KeyError) as exc:
+        raise ValueError(f"{file_name} is damaged: {exc}")
+
+    finally:
+        connection.close()
+
+    # everything matches the database now
+    lib.takeChanges()
+
+    return lib
+
+
+# reads only the tree of a library database
+
+
+def readTree(file_name: str, threshold: int = COLUMNAR_TREE_THRESHOLD) -> Node:
+
+    connection: sqlite3.Connection = _open(file_name)
+
+    try:
+        return _read_tree(connection, threshold)
+    except sqlite3.DatabaseError as exc:
+        raise ValueError(f"{file_name} is damaged: {exc}")
+    finally:
+        connection.close()
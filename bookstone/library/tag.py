@@ -1,4 +1,3 @@
-import copy
 from typing import Any
 
 
@@ -37,9 +36,15 @@ class Tag:
     def __repr__(self) -> str:
         return str(self)
 
+    # creates a copy of this tag
+    # every book copies all tags, so this avoids the overhead of copy.copy()
+
     def __call__(self) -> "Tag":
 
-        return copy.copy(self)
+        tag: Tag = self.__class__.__new__(self.__class__)
+        tag.__dict__.update(self.__dict__)
+
+        return tag
 
     def __eq__(self, other: Any) -> bool:
 
@@ -0,0 +1,110 @@
+import posixpath
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from .book import Book
+from .node import Node
+
+# the structural difference between two versions of a library tree
+# added and removed only contain the topmost node of every added or removed
+# subtree, its descendants are implied
+# modified contains files whose size or modification time changed and
+# directories whose modification time changed
+
+
+@dataclass
+class TreeDiff:
+
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+
+    def isEmpty(self) -> bool:
+        return not (self.added or self.removed or self.modified)
+
+
+# everything which changed within a library during an update
+# added, removed and changed are the books, just like in LibraryIndexingResult
+
+
+@dataclass
+class LibraryDelta:
+
+    tree: TreeDiff = field(default_factory=TreeDiff)
+    added: List[Book] = field(default_factory=list)
+    removed: List[Book] = field(default_factory=list)
+    changed: List[Book] = field(default_factory=list)
+
+    def isEmpty(self) -> bool:
+        return (
+            self.tree.isEmpty()
+            and not self.added
+            and not self.removed
+            and not self.changed
+        )
+
+
+# compares two trees and returns what changed from old to new
+# subtrees which are shared between both trees, like those the crawler takes
+# over from the previous tree, are skipped without being looked at,
+# so that the time needed only depends on the size of the changed subtrees
+
+# indexing runs and updates share subtrees with the previous tree,
+# so neither tree may be modified while comparing
+
+
+def diffTrees(old: Node, new: Node) -> TreeDiff:
+
+    diff: TreeDiff = TreeDiff()
+    name: str
+    new_child: Node
+    new_dir: Node
+    old_child: Node
+    old_children: Dict[str, Node]
+    old_dir: Node
+    stack: List[Tuple[Node, Node]] = [(old, new)]
+
+    while stack:
+
+        old_dir, new_dir = stack.pop()
+
+        if old_dir.isSameNode(new_dir):
+            continue
+
+        old_children = {c.getName(): c for c in old_dir.getChildren()}
+
+        for new_child in new_dir.getChildren():
+
+            name = new_child.getName()
+
+            if name not in old_children:
+                diff.added.append(new_child.getPath())
+                continue
+
+            old_child = old_children.pop(name)
+
+            if old_child.isSameNode(new_child):
+                continue
+
+            if old_child.isFile() != new_child.isFile():
+                diff.removed.append(new_child.getPath())
+                diff.added.append(new_child.getPath())
+            elif new_child.isFile():
+                if (
+                    old_child.getSize() != new_child.getSize()
+                    or old_child.getModificationTime()
+                    != new_child.getModificationTime()
+                ):
+                    diff.modified.append(new_child.getPath())
+            else:
+
+                if old_child.getModificationTime() != new_child.getModificationTime():
+                    diff.modified.append(new_child.getPath())
+
+                stack.append((old_child, new_child))
+
+        # whatever is left doesn't exist within the new tree anymore
+        for name in old_children:
+            diff.removed.append(posixpath.join(new_dir.getPath(), name))
+
+    return diff
@@ -0,0 +1,151 @@
+import os.path
+from typing import Any, Optional, Set
+
+import fs
+import fs.errors
+from fs.base import FS
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from .library import Library
+from .node import Node
+from .tag_matching import Patterns, getPatternDepth
+
+# time to wait for further changes before reporting them, in milliseconds
+DEBOUNCE_INTERVAL: int = 300
+
+# directories are watched down to the deepest level a book can be found at
+WATCH_DEPTH: int = max(getPatternDepth(p) for p in Patterns)
+
+
+# reports changes to a local library, so that it can be kept up to date
+# without crawling it
+# all directories down to WATCH_DEPTH are watched for changes
+# changes are collected for DEBOUNCE_INTERVAL after the first one and then
+# reported all at once, changed emits the paths of all directories which
+# changed, which is all that needs to be listed again
+# applying them is up to the receiver, who needs to call refresh() afterwards
+
+
+class LibraryWatcher(QObject):
+
+    changed: pyqtSignal = pyqtSignal(Library, set)
+
+    _fs: Optional[FS]
+    _library: Library
+    _paused: bool
+    _pending: Set[str]
+    _root: str
+    _timer: QTimer
+    _watcher: QFileSystemWatcher
+
+    def __init__(self, library: Library, *args: Any, **kwargs: Any) -> None:
+
+        super().__init__(*args, **kwargs)
+
+        self._fs = None
+        self._library = library
+        self._paused = False
+        self._pending = set()
+        self._root = ""
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_INTERVAL)
+        self._timer.timeout.connect(self._emit_changes)
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._directory_changed)
+
+    @staticmethod
+    def supportsLibrary(lib: Library) -> bool:
+        return lib.getPath().startswith("osfs://")
+
+    def start(self) -> None:
+
+        try:
+            self._fs = fs.open_fs(self._library.getPath())
+        except fs.errors.CreateFailed:
+            return
+
+        self._root = self._fs.getsyspath("/")
+
+        self.refresh()
+
+    def stop(self) -> None:
+
+        self._timer.stop()
+        self._pending.clear()
+
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+
+        if self._fs:
+            self._fs.close()
+            self._fs = None
+
+    # while paused, changes will be collected, but not applied
+    # this is necessary while the library is being indexed
+
+    def setPaused(self, paused: bool) -> None:
+
+        self._paused = paused
+
+        if not paused and self._pending:
+            self._timer.start()
+
+    # updates the watched directories to match the current tree, if loaded
+
+    def refresh(self) -> None:
+
+        if not self._fs:
+            return
+
+        node: Node
+        paths: Set[str] = {self._getSystemPath("")}
+        watched: Set[str] = set(self._watcher.directories())
+
+        # loading the tree here would block until it is read completely
+        # only the root is watched until an indexing run or an update
+        # loaded it, the manager refreshes the watcher after each of them
+        if self._library.isTreeLoaded():
+            for node, _ in self._library.getTree().walk(max_depth=WATCH_DEPTH):
+                if node.isDirectory():
+                    paths.add(self._getSystemPath(node.getPath()))
+
+        if watched - paths:
+            self._watcher.removePaths(list(watched - paths))
+
+        if paths - watched:
+            self._watcher.addPaths(list(paths - watched))
+
+    def _getSystemPath(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self._root, *path.split("/")))
+
+    def _getTreePath(self, path: str) -> str:
+
+        rel_path: str = os.path.relpath(path, self._root).replace(os.sep, "/")
+
+        if rel_path == ".":
+            return ""
+
+        return rel_path
+
+    def _directory_changed(self, path: str) -> None:
+
+        self._pending.add(self._getTreePath(path))
+
+        # restarting the timer on every change could delay reporting forever
+        if not self._paused and not self._timer.isActive():
+            self._timer.start()
+
+    def _emit_changes(self) -> None:
+
+        paths: Set[str]
+
+        if self._paused or not self._fs or not self._pending:
+            return
+
+        paths = set(self._pending)
+        self._pending.clear()
+
+        self.changed.emit(self._library, paths)
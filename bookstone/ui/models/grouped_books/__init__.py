@@ -1,10 +1,13 @@
-from typing import TYPE_CHECKING, Any, List, Optional, cast
+import posixpath
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, cast
 
 from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt, QVariant
 
 from library.book import Book
 from library.library import Library
+from library.tree_diff import LibraryDelta
 
+from .group import Group
 from .grouped_books_item import GroupedBooksItem, GroupedBooksItemType
 from .groups import Groups
 
@@ -12,8 +15,16 @@ if TYPE_CHECKING:
     from library.manager import LibraryManager
 
 
+# libraries are built completely whenever they get added or their groups
+# change, which resets the model
+# changes found by indexing or watching a library are applied with
+# applyDelta() instead, which only touches the affected rows
+
+
 class GroupedBooksModel(QAbstractItemModel):
 
+    # the item of every book, by library and book path
+    _book_items: Dict[Library, Dict[str, GroupedBooksItem]]
     _library_manager: "LibraryManager"
     _root: GroupedBooksItem
 
@@ -22,10 +33,12 @@ class GroupedBooksModel(QAbstractItemModel):
     ) -> None:
         super().__init__(*args, **kwargs)
 
+        self._book_items = {}
         self._root = GroupedBooksItem(type=GroupedBooksItemType.root)
         self._library_manager = library_manager
         self._library_manager.libraryAdded.connect(self.update)
         self._library_manager.libraryUpdated.connect(self.update)
+        self._library_manager.libraryChanged.connect(self.applyDelta)
         self._library_manager.libraryRemoved.connect(lambda l: self.update(l, True))
 
         self.update()
@@ -77,10 +90,13 @@ class GroupedBooksModel(QAbstractItemModel):
 
                 child_number = -1
 
+            self._book_items.pop(lib, None)
+
             if removed:
                 continue
 
             self._root.insertChild(lib_item, child_number)
+            self._book_items[lib] = {}
 
             for book in lib.getBooks():
 
@@ -93,9 +109,139 @@ class GroupedBooksModel(QAbstractItemModel):
                     book_path=book.path,
                 )
                 parent.insertChild(book_item)
+                self._book_items[lib][book.path] = book_item
 
         self.modelReset.emit()  # type: ignore
 
+    def applyDelta(self, lib: Library, delta: LibraryDelta) -> None:
+
+        book: Book
+        changed: Set[str] = {b.path for b in delta.changed}
+        items: Dict[str, GroupedBooksItem]
+        lib_item: Optional[GroupedBooksItem] = self._root.getChild(f"lib:{lib.uuid}")
+        path: str
+
+        if not lib_item or lib not in self._book_items:
+            self.update(lib)
+            return
+
+        items = self._book_items[lib]
+
+        for book in delta.removed:
+            if book.path in items:
+                self._remove_item(items.pop(book.path))
+
+        for book in delta.added:
+            if book.path not in items:
+                items[book.path] = self._insert_book(lib_item, book)
+
+        # changed tags might move books into other groups
+        for book in delta.changed:
+            if (
+                book.path in items
+                and self._find_parent(lib_item, book) is not items[book.path].parent
+            ):
+                self._remove_item(items[book.path])
+                items[book.path] = self._insert_book(lib_item, book)
+
+        # sizes of books change along with the files within them
+        for path in delta.tree.added + delta.tree.removed + delta.tree.modified:
+
+            while path != "":
+
+                if path in items:
+                    changed.add(path)
+                    break
+
+                path = posixpath.dirname(path)
+
+        for path in changed:
+            if path in items:
+                self._item_changed(items[path])
+
+        self._item_changed(lib_item)
+
+    def _get_index(self, item: GroupedBooksItem, column: int = 0) -> QModelIndex:
+
+        if item == self._root or not item.parent:
+            return QModelIndex()
+
+        return self.createIndex(cast(int, item.childNumber), column, item)
+
+    def _item_changed(self, item: GroupedBooksItem) -> None:
+        self.dataChanged.emit(
+            self._get_index(item), self._get_index(item, self.columnCount() - 1)
+        )
+
+    # returns the item the book would be placed in, or None if
+    # one of its groups doesn't exist yet
+
+    def _find_parent(
+        self, lib_item: GroupedBooksItem, book: Book
+    ) -> Optional[GroupedBooksItem]:
+
+        group: Group
+        parent: Optional[GroupedBooksItem] = lib_item
+
+        for group in [Groups[g] for g in lib_item._library.getGroups() if g in Groups]:
+
+            if not parent:
+                break
+
+            parent = parent.getChild(
+                f"group:{lib_item._library.uuid};{group.getName(book)}"
+            )
+
+        return parent
+
+    def _insert_book(self, lib_item: GroupedBooksItem, book: Book) -> GroupedBooksItem:
+
+        book_item: GroupedBooksItem
+        group: Group
+        parent: GroupedBooksItem = lib_item
+
+        for group in [Groups[g] for g in lib_item._library.getGroups() if g in Groups]:
+
+            if not parent.getChild(
+                f"group:{lib_item._library.uuid};{group.getName(book)}"
+            ):
+                self.beginInsertRows(
+                    self._get_index(parent), parent.childCount, parent.childCount
+                )
+                parent = group.getItem(parent, book)
+                self.endInsertRows()
+            else:
+                parent = group.getItem(parent, book)
+
+        book_item = GroupedBooksItem(
+            type=GroupedBooksItemType.book,
+            parent=parent,
+            library=lib_item._library,
+            book_path=book.path,
+        )
+
+        self.beginInsertRows(
+            self._get_index(parent), parent.childCount, parent.childCount
+        )
+        parent.insertChild(book_item)
+        self.endInsertRows()
+
+        return book_item
+
+    # removes groups which became empty as well
+
+    def _remove_item(self, item: GroupedBooksItem) -> None:
+
+        parent: GroupedBooksItem = cast(GroupedBooksItem, item.parent)
+        row: int = cast(int, item.childNumber)
+
+        self.beginRemoveRows(self._get_index(parent), row, row)
+        parent.removeChild(row)
+        self.endRemoveRows()
+
+        if parent._type == GroupedBooksItemType.group and parent.childCount == 0:
+            self._remove_item(parent)
+
     def getItem(self, index: QModelIndex) -> GroupedBooksItem:
 
         if index.isValid():
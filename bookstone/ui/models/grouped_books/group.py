@@ -12,15 +12,17 @@ class Group:
     tag: str
     replacement_text: str = ""
 
+    def getName(self, book: Book) -> str:
+
+        if book.tags[self.tag].isModified() or self.replacement_text == "":
+            return book.tags[self.tag].value
+
+        return self.replacement_text
+
     def getItem(self, parent: GroupedBooksItem, book: Book) -> GroupedBooksItem:
 
         group_item: Optional[GroupedBooksItem]
-        group_name: str
-
-        if book.tags[self.tag].isModified() or self.replacement_text == "":
-            group_name = book.tags[self.tag].value
-        else:
-            group_name = self.replacement_text
+        group_name: str = self.getName(book)
 
         group_item = parent.getChild(f"group:{parent._library.uuid};{group_name}")
 
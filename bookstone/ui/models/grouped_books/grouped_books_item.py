@@ -1,8 +1,11 @@
 from enum import IntFlag, auto
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+from PyQt5.QtCore import QLocale
+
 from library.book import Book
 from library.library import Library
+from library.node import Node
 
 
 class GroupedBooksItemType(IntFlag):
@@ -116,7 +119,7 @@ class GroupedBooksItem:
 
     @property
     def columnCount(self) -> int:
-        return 4
+        return 5
 
     @property
     def columnNames(self) -> Tuple[str, ...]:
@@ -125,6 +128,7 @@ class GroupedBooksItem:
             "Author",
             "Series",
             "Volume",
+            "Size",
         )
 
     def getColumnText(self, column: int) -> str:
@@ -157,6 +161,28 @@ class GroupedBooksItem:
                     return book.tags["volume"].value
                 elif not book:
                     return "Unknown Book"
+        elif column == 4:
+            return self._get_size_text()
+
+        return ""
+
+    # directories know the size of everything below them,
+    # so this doesn't need to walk the book
+    # the sizes of books are left out until the tree got loaded
+    # by someone else, since loading it here would block the ui
+
+    def _get_size_text(self) -> str:
+
+        node: Optional[Node] = None
+
+        if self._type == GroupedBooksItemType.library:
+            return QLocale().formattedDataSize(self._library.getTotalSize())
+
+        if self._type == GroupedBooksItemType.book and self._library.isTreeLoaded():
+            node = self._library.getTree().findChild(self._book_path)
+
+        if node:
+            return QLocale().formattedDataSize(node.getTotalSize())
 
         return ""
 
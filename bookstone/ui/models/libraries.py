@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Type
 
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QLocale, QTimer
 from PyQt5.QtGui import QStandardItem, QStandardItemModel
 
 from library.library import Library
@@ -37,6 +37,11 @@ class LibrariesModel(QStandardItemModel):
         self._library_status_timer.timeout.connect(self._update_library_status)
         self._library_status_timer.start()
 
+        # libraries are added while being loaded as well,
+        # possibly while the model is already shown
+        self._library_manager.libraryAdded.connect(lambda lib: self.reloadLibraries())
+        self._library_manager.libraryRemoved.connect(lambda lib: self.reloadLibraries())
+
         self.reloadLibraries()
 
     def reloadLibraries(self) -> None:
@@ -45,8 +50,10 @@ class LibrariesModel(QStandardItemModel):
 
         self.clear()
 
-        self.setColumnCount(3)
-        self.setHorizontalHeaderLabels(["Name", "Connection", "Status"])
+        self.setColumnCount(5)
+        self.setHorizontalHeaderLabels(
+            ["Name", "Connection", "Status", "Files", "Size"]
+        )
 
         self._libraries = self._library_manager.getLibraries()
 
@@ -72,12 +79,30 @@ class LibrariesModel(QStandardItemModel):
             item.setEditable(False)
             row.append(item)
 
-            item = QStandardItem(self._library_manager.getIndexingStatus(lib) or "Idle")
+            item = QStandardItem(str(self._library_manager.getIndexingStatus(lib)))
+            item.setEditable(False)
+            row.append(item)
+
+            item = QStandardItem(self._get_file_count(lib))
+            item.setEditable(False)
+            row.append(item)
+
+            item = QStandardItem(self._get_size(lib))
             item.setEditable(False)
             row.append(item)
 
             self.appendRow(row)
 
+    # the trees keep track of their file count and size,
+    # so they're cheap enough to be refreshed together with the status
+    # libraries know both even without loading their trees
+
+    def _get_file_count(self, lib: Library) -> str:
+        return str(lib.getFileCount())
+
+    def _get_size(self, lib: Library) -> str:
+        return QLocale().formattedDataSize(lib.getTotalSize())
+
     def updateLibrary(self, lib: Library) -> None:
 
         index: int = self._libraries.index(lib)
@@ -88,11 +113,25 @@ class LibrariesModel(QStandardItemModel):
 
         item = self.item(index, 2)
 
-        status = self._library_manager.getIndexingStatus(lib) or "Idle."
+        status: str = str(self._library_manager.getIndexingStatus(lib))
 
         if item.text() != status:
             item.setText(status)
 
+        item = self.item(index, 3)
+
+        text: str = self._get_file_count(lib)
+
+        if item.text() != text:
+            item.setText(text)
+
+        item = self.item(index, 4)
+
+        text = self._get_size(lib)
+
+        if item.text() != text:
+            item.setText(text)
+
     def _update_library_status(self) -> None:
 
         for lib in self._libraries:
@@ -4,6 +4,7 @@ from PyQt5.QtCore import QEvent, QObject
 from PyQt5.QtGui import QContextMenuEvent
 from PyQt5.QtWidgets import QAction, QLabel, QMenu, QPushButton, QTableView, QVBoxLayout
 
+from library.indexing_scheduler import IndexingPriority
 from library.library import Library
 from library.manager import LibraryManager
 from ui.models.libraries import LibrariesModel
@@ -50,8 +51,10 @@ class LibrariesWindow(Window):
 
         layout = QVBoxLayout(self)
 
-        self.libraries_label = QLabel("Known libraries", self)
+        self.libraries_label = QLabel(self)
         layout.addWidget(self.libraries_label)
+        self._update_libraries_label()
+        self._library_manager.librariesLoaded.connect(self._update_libraries_label)
 
         self.libraries_list = QTableView(self)
         self.libraries_list.setTabKeyNavigation(False)
@@ -87,6 +90,15 @@ class LibrariesWindow(Window):
 
         self.setLayout(layout)
 
+    # libraries which are still being loaded will show up one by one
+
+    def _update_libraries_label(self) -> None:
+
+        if self._library_manager.isLoading():
+            self.libraries_label.setText("Known libraries (loading...)")
+        else:
+            self.libraries_label.setText("Known libraries")
+
     def showAddDialog(self, tab: Type[BackendTab]) -> None:
 
         library: Library = Library()
@@ -99,9 +111,7 @@ class LibrariesWindow(Window):
 
         self._library_manager.addLibrary(library)
         self._library_manager.save(library)
-        self._library_manager.startIndexing(library)
-
-        self.libraries_model.reloadLibraries()
+        self._library_manager.startIndexing(library, IndexingPriority.user)
 
     def generateShowAddDialogLambda(self, tab: Type[BackendTab]) -> Callable[[], None]:
         return lambda: self.showAddDialog(tab)
@@ -111,7 +121,6 @@ class LibrariesWindow(Window):
         self._library_manager.removeLibrary(lib)
 
         self.libraries_list.selectionModel().clearSelection()
-        self.libraries_model.reloadLibraries()
 
     def editLibrary(self, lib: Library) -> None:
 
@@ -131,6 +140,7 @@ class LibrariesWindow(Window):
             return
 
         self._library_manager.save(lib)
+        self._library_manager.updateWatching(lib)
         self.libraries_model.updateLibrary(lib)
 
     def eventFilter(self, source: QObject, event: QEvent) -> bool:
@@ -152,6 +162,11 @@ class LibrariesWindow(Window):
                 act.triggered.connect(lambda: self.editLibrary(lib))
                 menu.addAction(act)
 
+                if self._library_manager.isIndexingQueued(lib):
+                    act = QAction("Index next", menu)
+                    act.triggered.connect(lambda: self.prioritizeIndexing(lib))
+                    menu.addAction(act)
+
                 if self._library_manager.isIndexing(lib):
                     act = QAction("Abort indexing", menu)
                     act.triggered.connect(lambda: self.abortIndexing(lib))
@@ -173,7 +188,14 @@ class LibrariesWindow(Window):
         if self._library_manager.isIndexing(lib):
             return
 
-        self._library_manager.startIndexing(lib)
+        self._library_manager.startIndexing(lib, IndexingPriority.user)
+
+    def prioritizeIndexing(self, lib: Library) -> None:
+
+        if not self._library_manager.isIndexingQueued(lib):
+            return
+
+        self._library_manager.startIndexing(lib, IndexingPriority.user)
 
     def abortIndexing(self, lib: Library) -> None:
 
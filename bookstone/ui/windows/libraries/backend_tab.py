@@ -38,6 +38,11 @@ class BackendTab(QWidget):
     def setPath(self, path: str) -> None:
         pass
 
+    # whether libraries of this kind can be watched for changes
+    @staticmethod
+    def supportsWatching() -> bool:
+        return False
+
     @classmethod
     def matchesPath(cls: Type[T], path: str) -> bool:
         return bool(cls._PATH_REGEX_.match(path))
@@ -4,17 +4,20 @@ from typing import Any, Pattern, Type, cast
 import fs
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import (
+    QCheckBox,
     QDialog,
     QDialogButtonBox,
     QHBoxLayout,
     QLabel,
     QLineEdit,
     QMessageBox,
+    QSpinBox,
     QTabWidget,
     QWidget,
 )
 
-from library.library import Library
+from connection_pool import MAX_CONNECTIONS_PER_URL
+from library.library import Library, LibraryStorage
 
 from .backend_tab import BackendTab
 
@@ -23,12 +26,15 @@ class DetailsDialog(QDialog):
 
     backend_tab: BackendTab
     button_box: QDialogButtonBox
+    connections_input: QSpinBox
+    database_checkbox: QCheckBox
     general_tab: QWidget
     library: Library
     name_input: QLineEdit
     name_input_was_edited: bool
     tabs: QTabWidget
     updated: pyqtSignal = pyqtSignal()
+    watch_checkbox: QCheckBox
 
     def __init__(
         self, backend_tab: Type[BackendTab], library: Library, *args: Any, **kwargs: Any
@@ -58,6 +64,30 @@ class DetailsDialog(QDialog):
         name_label.setBuddy(self.name_input)
         general_layout.addWidget(self.name_input)
 
+        connections_label: QLabel = QLabel(
+            "Parallel connections while indexing:", self.general_tab
+        )
+        general_layout.addWidget(connections_label)
+
+        self.connections_input = QSpinBox(self.general_tab)
+        self.connections_input.setRange(1, MAX_CONNECTIONS_PER_URL)
+        self.connections_input.setValue(self.library.getIndexingConnections())
+        connections_label.setBuddy(self.connections_input)
+        general_layout.addWidget(self.connections_input)
+
+        self.watch_checkbox = QCheckBox("Watch for changes", self.general_tab)
+        self.watch_checkbox.setChecked(self.library.isWatched())
+        self.watch_checkbox.setVisible(backend_tab.supportsWatching())
+        general_layout.addWidget(self.watch_checkbox)
+
+        self.database_checkbox = QCheckBox(
+            "Store in a database (saves small changes faster)", self.general_tab
+        )
+        self.database_checkbox.setChecked(
+            self.library.getStorage() == LibraryStorage.database
+        )
+        general_layout.addWidget(self.database_checkbox)
+
         self.general_tab.setLayout(general_layout)
 
         self.tabs.addTab(self.general_tab, "General")
@@ -139,6 +169,15 @@ class DetailsDialog(QDialog):
 
         self.library.setPath(self.backend_tab.getPath())
         self.library.setName(self.name_input.text())
+        self.library.setIndexingConnections(self.connections_input.value())
+        self.library.setWatched(
+            self.backend_tab.supportsWatching() and self.watch_checkbox.isChecked()
+        )
+        self.library.setStorage(
+            LibraryStorage.database
+            if self.database_checkbox.isChecked()
+            else LibraryStorage.binary
+        )
 
         return super().accept()
 
@@ -37,6 +37,10 @@ class LocalBackendTab(BackendTab):
     def getName() -> str:
         return "Local"
 
+    @staticmethod
+    def supportsWatching() -> bool:
+        return True
+
     def browseDirectory(self) -> None:
 
         picker: QFileDialog = QFileDialog(self)
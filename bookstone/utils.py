@@ -18,6 +18,10 @@ def getLibrariesDirectory() -> str:
     return os.path.join(getConfigDirectory(), "libraries")
 
 
+def getCheckpointsDirectory() -> str:
+    return os.path.join(getConfigDirectory(), "checkpoints")
+
+
 def getConfigFile() -> str:
     return os.path.join(getConfigDirectory(), "settings.json")
 
@@ -0,0 +1,60 @@
+from typing import Optional
+
+from PyQt5.QtCore import QThread
+
+from exceptions import ThreadStoppedError
+
+# amount of iterations between two cancellation checks done by tick()
+CHECK_INTERVAL: int = 256
+
+
+# lets the main thread cancel a worker without the worker having to pump events
+# cancellation is requested either via cancel() or via
+# QThread.requestInterruption() on the thread the token is used in
+# tick() is cheap enough to be called once per iteration in hot loops,
+# the thread will only be asked every interval iterations
+
+
+class CancellationToken:
+
+    _cancelled: bool
+    _counter: int
+    _interval: int
+    _thread: Optional[QThread]
+
+    def __init__(self, interval: int = CHECK_INTERVAL) -> None:
+
+        self._cancelled = False
+        self._counter = 0
+        self._interval = max(1, interval)
+        self._thread = None
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def isCancelled(self) -> bool:
+
+        if self._cancelled:
+            return True
+
+        if self._thread is None:
+            self._thread = QThread.currentThread()
+
+        if self._thread.isInterruptionRequested():
+            self._cancelled = True
+
+        return self._cancelled
+
+    def check(self) -> None:
+
+        self._counter = 0
+
+        if self.isCancelled():
+            raise ThreadStoppedError()
+
+    def tick(self) -> None:
+
+        self._counter += 1
+
+        if self._counter >= self._interval:
+            self.check()
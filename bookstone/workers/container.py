@@ -2,18 +2,26 @@ from dependency_injector.containers import DeclarativeContainer
 from dependency_injector.providers import Dependency, Factory
 from PyQt5.QtWidgets import QApplication
 
+from connection_pool import ConnectionPool
+
 from .library_indexing import LibraryIndexingWorker
+from .library_loader import LibraryLoaderWorker
 from .library_saver import LibrarySaverWorker
 
 
 class WorkerContainer(DeclarativeContainer):
 
     application: Dependency[QApplication] = Dependency()
+    connection_pool: Dependency[ConnectionPool] = Dependency()
 
     library_indexing_worker: Factory[LibraryIndexingWorker] = Factory(
-        LibraryIndexingWorker, application=application
+        LibraryIndexingWorker, application=application, connection_pool=connection_pool
     )
 
     library_saver_worker: Factory[LibrarySaverWorker] = Factory(
         LibrarySaverWorker, application=application
     )
+
+    library_loader_worker: Factory[LibraryLoaderWorker] = Factory(
+        LibraryLoaderWorker, application=application
+    )
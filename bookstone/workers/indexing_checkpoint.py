@@ -0,0 +1,177 @@
+import json
+import os
+import os.path
+import warnings
+from dataclasses import dataclass, field
+from datetime import datetime
+from json.decoder import JSONDecodeError
+from typing import Any, Dict, List, Optional, Tuple
+
+from library.library import Library
+from library.node import EPOCH, MICROSECOND
+from utils import getCheckpointsDirectory
+
+CHECKPOINT_VERSION: int = 2
+# minimum time between two checkpoints written while crawling, in seconds
+CHECKPOINT_INTERVAL: int = 30
+
+
+# a single entry of a directory listing
+# produced by the crawler threads and turned into nodes by the worker
+
+
+@dataclass
+class DirectoryEntry:
+
+    name: str
+    directory: bool
+    size: int = -1
+    modification_time: datetime = field(default_factory=lambda: EPOCH)
+
+
+# the state of an unfinished crawl is the listings of all directories which
+# were listed during it
+# a checkpoint is a journal: the first line identifies the library, every
+# further line holds one listing as JSON, and every checkpoint written while
+# crawling only appends the listings which were made since the previous one,
+# so writing a checkpoint takes time proportional to the progress since then,
+# not to the size of the tree
+# resuming crawls the library again, but takes all listings from the
+# checkpoint instead of listing those directories once more
+# a line which was only partially written is ignored when loading and
+# dropped before appending to the checkpoint again
+
+
+def getCheckpointFileName(lib: Library) -> str:
+    return os.path.join(getCheckpointsDirectory(), lib.uuid + ".jsonl")
+
+
+def _serialize_entry(entry: DirectoryEntry) -> List[Any]:
+    return [
+        entry.name,
+        entry.directory,
+        entry.size,
+        (entry.modification_time - EPOCH) // MICROSECOND,
+    ]
+
+
+def _deserialize_entry(ser: List[Any]) -> DirectoryEntry:
+    return DirectoryEntry(
+        name=ser[0],
+        directory=ser[1],
+        size=ser[2],
+        modification_time=EPOCH + ser[3] * MICROSECOND,
+    )
+
+
+# truncates the file after its last complete line, dropping a line which was
+# only partially written, e.g. because the application crashed while writing
+# only reads as much of the file from its end as necessary
+
+
+def _truncate_partial_line(file_name: str) -> None:
+
+    chunk: bytes
+    chunk_size: int = 4096
+    end: int
+    position: int
+
+    with open(file_name, "r+b") as f:
+
+        end = f.seek(0, os.SEEK_END)
+        position = end
+
+        while position > 0:
+
+            chunk_size = min(chunk_size, position)
+            position -= chunk_size
+            f.seek(position)
+            chunk = f.read(chunk_size)
+
+            if b"\n" in chunk:
+                position += chunk.rindex(b"\n") + 1
+                break
+
+        if position < end:
+            f.truncate(position)
+
+
+# starts a new checkpoint for the library, replacing any existing one,
+# unless append is True
+# listings are given as the path of the directory and its entries
+
+
+def saveCheckpoint(
+    lib: Library, listings: List[Tuple[str, List[DirectoryEntry]]], append: bool
+) -> None:
+
+    entries: List[DirectoryEntry]
+    file_name: str = getCheckpointFileName(lib)
+    path: str
+
+    os.makedirs(getCheckpointsDirectory(), exist_ok=True)
+
+    if append:
+        _truncate_partial_line(file_name)
+
+    with open(file_name, "a" if append else "w", encoding="utf-8") as f:
+
+        if not append:
+            f.write(
+                json.dumps({"version": CHECKPOINT_VERSION, "path": lib.getPath()})
+                + "\n"
+            )
+
+        for path, entries in listings:
+            f.write(json.dumps([path, [_serialize_entry(e) for e in entries]]) + "\n")
+
+
+# returns all listings of the checkpoint of the library by path,
+# or None if there is no usable checkpoint
+
+
+def loadCheckpoint(lib: Library) -> Optional[Dict[str, List[DirectoryEntry]]]:
+
+    file_name: str = getCheckpointFileName(lib)
+    header: Dict[str, Any]
+    line: str
+    listings: Dict[str, List[DirectoryEntry]] = {}
+    ser: List[Any]
+
+    if not os.path.exists(file_name):
+        return None
+
+    try:
+
+        with open(file_name, "r", encoding="utf-8") as f:
+
+            header = json.loads(f.readline())
+
+            # the library might have been moved in the meantime
+            if (
+                header.get("version") != CHECKPOINT_VERSION
+                or header.get("path") != lib.getPath()
+            ):
+                return None
+
+            for line in f:
+
+                try:
+                    ser = json.loads(line)
+                    listings[ser[0]] = [_deserialize_entry(e) for e in ser[1]]
+                except (JSONDecodeError, IndexError, TypeError):
+                    break
+
+    except (OSError, JSONDecodeError, AttributeError):
+        warnings.warn(f"invalid indexing checkpoint found in {file_name}")
+        return None
+
+    return listings
+
+
+def removeCheckpoint(lib: Library) -> None:
+
+    file_name: str = getCheckpointFileName(lib)
+
+    if os.path.exists(file_name):
+        os.remove(file_name)
@@ -1,22 +1,39 @@
+import dataclasses
 import posixpath
-import queue
+import time
 import warnings
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Pattern
+from enum import Enum
+from typing import Deque, Dict, List, Optional, Pattern, Set, Tuple, cast
 
 import fs
-from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+from fs.info import Info
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import QApplication
 
+from connection_pool import ConnectionPool
 from exceptions import ThreadStoppedError
 from library.book import Book
+from library.columnar_tree import compactTree
 from library.library import Library
 from library.node import Node
 from library.tag_collection import TagCollection
 from library.tag_matching import Patterns, getPatternDepth, matchPattern
+from library.tree_diff import TreeDiff, diffTrees
 from utils import getSupportedFileExtensions
 
+from .cancellation_token import CancellationToken
+from .indexing_checkpoint import (
+    CHECKPOINT_INTERVAL,
+    DirectoryEntry,
+    loadCheckpoint,
+    removeCheckpoint,
+    saveCheckpoint,
+)
+
 
 @dataclass
 class LibraryIndexingResult:
@@ -24,203 +41,745 @@ class LibraryIndexingResult:
     library: Library
     tree: Optional[Node]
     books: List[Book]
+    added: List[Book] = field(default_factory=list)
+    removed: List[Book] = field(default_factory=list)
+    changed: List[Book] = field(default_factory=list)
+    tree_diff: TreeDiff = field(default_factory=TreeDiff)
+
+
+# minimum time between two progress updates sent by the worker, in milliseconds
+PROGRESS_INTERVAL: int = 250
+
+
+class LibraryIndexingPhase(Enum):
+
+    waiting = "Waiting."
+    queued = "Queued."
+    started = "Started."
+    crawling = "Crawling"
+    matching = "Matching"
+    finished = "Finished."
+    failed = "Failed."
+    aborted = "Aborted."
+
+
+# a snapshot of the indexing progress of a library
+# rate is given in directories per second, eta in seconds
+# eta is only known while crawling libraries which were indexed before
+
+
+@dataclass
+class LibraryIndexingProgress:
+
+    phase: LibraryIndexingPhase = LibraryIndexingPhase.waiting
+    directories: int = 0
+    files: int = 0
+    books: int = 0
+    bytes: int = 0
+    pending: int = 0
+    rate: float = 0.0
+    eta: Optional[float] = None
+    queue_position: int = 0
+
+    def __str__(self) -> str:
+
+        msg: str
+
+        if self.phase == LibraryIndexingPhase.queued:
+            return f"Queued at position {self.queue_position + 1}."
+
+        if self.phase == LibraryIndexingPhase.crawling:
+
+            msg = f"{self.directories} directories and {self.files} files indexed"
+
+            if self.rate > 0:
+                msg += f", {self.rate:.1f} directories/s"
+
+            if self.eta is not None:
+                msg += f", about {int(self.eta)} s left"
+
+            return msg + "."
+
+        elif self.phase == LibraryIndexingPhase.matching:
+            return f"{self.books} books found."
+
+        return self.phase.value
 
 
 class LibraryIndexingWorker(QObject):
 
     application: QApplication
+    connection_pool: ConnectionPool
     finished: pyqtSignal = pyqtSignal()
     library: Library
+    # if given, only these directories will be listed again, see run()
+    paths: Optional[Set[str]]
+    progress: pyqtSignal = pyqtSignal(Library, LibraryIndexingProgress)
     result: pyqtSignal = pyqtSignal(LibraryIndexingResult)
-    status: pyqtSignal = pyqtSignal(Library, str)
 
-    def __init__(self, application: QApplication, library: Library):
+    _cancellation: CancellationToken
+    # files within the tree of the previous run and the tree being crawled
+    _expected_files: int
+    _found_files: int
+    _progress: LibraryIndexingProgress
+    _progress_directories: int
+    _progress_time: float
+    # files found and time when the crawl started
+    _start_files: int
+    _start_time: float
+
+    def __init__(
+        self,
+        application: QApplication,
+        connection_pool: ConnectionPool,
+        library: Library,
+        paths: Optional[Set[str]] = None,
+    ):
 
         super().__init__()
         self.application = application
+        self.connection_pool = connection_pool
         self.library = library
+        self.paths = paths
+        self._cancellation = CancellationToken()
+        self._expected_files = 0
+        self._found_files = 0
+        self._progress = LibraryIndexingProgress()
+        self._progress_directories = 0
+        self._progress_time = time.monotonic()
+        self._start_files = 0
+        self._start_time = self._progress_time
+
+    # may be called from any thread
+    def cancel(self) -> None:
+        self._cancellation.cancel()
+
+    # sends a copy of the current progress to the main thread
+    # at most once per PROGRESS_INTERVAL, unless forced to
+
+    def _publish_progress(self, force: bool = False) -> None:
+
+        now: float = time.monotonic()
+        elapsed: float = now - self._progress_time
+
+        if not force and elapsed * 1000 < PROGRESS_INTERVAL:
+            return
+
+        if elapsed > 0:
+            self._progress.rate = (
+                self._progress.directories - self._progress_directories
+            ) / elapsed
+
+        self._progress.eta = self._estimate_remaining_time(now)
+
+        self._progress_directories = self._progress.directories
+        self._progress_time = now
+
+        self.progress.emit(self.library, dataclasses.replace(self._progress))
+
+    # the amount of directories still to be listed keeps growing while
+    # the crawl discovers new ones, so it says little about the time left
+    # the amount of files found by the previous run however is a good guess
+    # for the amount of files the crawl is going to end up with
+    # files of unchanged directories are taken over all at once, which is
+    # why the rate is averaged over the whole crawl
+
+    def _estimate_remaining_time(self, now: float) -> Optional[float]:
+
+        found: int = self._found_files - self._start_files
+
+        if (
+            self._progress.phase != LibraryIndexingPhase.crawling
+            or self._expected_files <= self._found_files
+            or found <= 0
+        ):
+            return None
+
+        return (
+            (self._expected_files - self._found_files)
+            * (now - self._start_time)
+            / found
+        )
+
+    def _set_phase(self, phase: LibraryIndexingPhase) -> None:
+
+        self._progress.phase = phase
+        self._publish_progress(force=True)
+
+    # sends an empty result, so that everyone waiting for this run
+    # knows that it is over
+
+    def _fail(self) -> None:
+
+        self._set_phase(LibraryIndexingPhase.failed)
+
+        self.result.emit(
+            LibraryIndexingResult(library=self.library, tree=None, books=[])
+        )
+
+        self.finished.emit()
+
+    # crawls the whole library, or only updates the directories given as paths
+    # the latter is meant for changes reported by the watcher and neither
+    # touches checkpoints nor compacts the tree
 
     @pyqtSlot()
     def run(self) -> None:
 
         try:
 
-            self.status.emit(self.library, "Started.")
+            self._set_phase(LibraryIndexingPhase.started)
 
-            tree: Optional[Node] = self.indexFolderStructure(self.library)
+            rescanned: Set[str] = set()
+            tree: Optional[Node]
+
+            if self.paths is None:
+                tree = self.indexFolderStructure(self.library, rescanned)
+            else:
+                tree = self.updateFolderStructure(self.library, self.paths, rescanned)
 
             if not tree:
-                self.status.emit(self.library, "Failed.")
+                self._fail()
+                return
 
-                self.result.emit(
-                    LibraryIndexingResult(library=self.library, tree=None, books=[])
-                )
+            self._cancellation.check()
 
-                self.finished.emit()
+            books: List[Book] = self.indexBooks(self.library, tree, rescanned)
 
-                return
+            self._cancellation.check()
+
+            # compacting copies the tree, subtrees shared with the old tree
+            # can only be skipped while comparing before that
+            tree_diff: TreeDiff = diffTrees(self.library.getTree(), tree)
 
-            books: List[Book] = self.indexBooks(self.library, tree)
+            # updates of columnar trees share most of it, and need to become
+            # columnar trees again as well
+            tree = compactTree(tree)
 
-            self.status.emit(self.library, "Finished.")
+            self._set_phase(LibraryIndexingPhase.finished)
 
-            self.result.emit(
-                LibraryIndexingResult(library=self.library, tree=tree, books=books)
-            )
+            self.result.emit(self.createResult(tree, books, rescanned, tree_diff))
 
             self.finished.emit()
 
-        except ThreadStoppedError:
-            self.status.emit(self.library, "Aborted.")
-            pass
+        # e.g. the connection got lost or access was denied somewhere
+        except fs.errors.FSError as exc:
+            warnings.warn(f"unable to index {self.library.getName()}: {exc}")
+            self._fail()
 
-    def indexFolderStructure(self, lib: Library) -> Optional[Node]:
+        except ThreadStoppedError:
+            self._set_phase(LibraryIndexingPhase.aborted)
+            self.finished.emit()
 
-        existing_node: Optional[Node]
-        node_count: int = 0
+    # compares the books found with the books currently known to the library
+    # and the tree with the current tree of the library, unless the difference
+    # between both trees is already known
+
+    def createResult(
+        self,
+        tree: Node,
+        books: List[Book],
+        rescanned: Set[str],
+        tree_diff: Optional[TreeDiff] = None,
+    ) -> LibraryIndexingResult:
+
+        if tree_diff is None:
+            tree_diff = diffTrees(self.library.getTree(), tree)
+
+        old_books: Dict[str, Book] = {b.path: b for b in self.library.getBooks()}
+        new_paths: Set[str] = {b.path for b in books}
+
+        return LibraryIndexingResult(
+            library=self.library,
+            tree=tree,
+            books=books,
+            added=[b for b in books if b.path not in old_books],
+            removed=[b for path, b in old_books.items() if path not in new_paths],
+            changed=[b for b in books if b.path in old_books and b.path in rescanned],
+            tree_diff=tree_diff,
+        )
+
+    # if a set is given for rescanned, the paths of all directories
+    # which had to be listed during this run will be added to it
+    # all other directories were taken over from the previous tree unchanged
+    # the crawl is checkpointed regularly and when being aborted,
+    # and the next crawl of the library will resume from that checkpoint
+
+    def indexFolderStructure(
+        self, lib: Library, rescanned: Optional[Set[str]] = None
+    ) -> Optional[Node]:
+
+        future: "Future[List[DirectoryEntry]]"
+        checkpoint: Optional[Dict[str, List[DirectoryEntry]]] = loadCheckpoint(lib)
+        # listings of the unfinished crawl the checkpoint was written by
+        cached: Dict[str, List[DirectoryEntry]] = checkpoint or {}
+        # whether new listings can be appended to the existing checkpoint
+        append: bool = checkpoint is not None
+        checkpoint_time: float = time.monotonic()
+        connections: int = lib.getIndexingConnections()
+        entries: List[DirectoryEntry]
+        # listings which weren't written to the checkpoint yet
+        journal: List[Tuple[str, List[DirectoryEntry]]] = []
+        next: Node
         old_tree: Node = lib.getTree()
-        scan: bool
+        path: str
         tree: Node = Node()
         tree.setDirectory()
 
-        open: queue.Queue[Node] = queue.Queue()
+        if rescanned is None:
+            rescanned = set()
 
-        open.put(tree)
+        self._expected_files = old_tree.getFileCount()
+        self._found_files = tree.getFileCount()
+        self._start_files = self._found_files
+        self._start_time = time.monotonic()
 
-        try:
+        # directories which still need to be listed, but aren't yet
+        queue: Deque[Node] = deque()
+        # directory listings currently in flight, mapped to the node
+        # their results will be attached to
+        # no more listings than connections are submitted at once, so that
+        # waiting for them doesn't get slower while the crawl discovers more
+        pending: Dict["Future[List[DirectoryEntry]]", Node] = {}
 
-            with fs.open_fs(lib.getPath()) as f:
+        # a single connection doesn't need any threads at all
+        pool: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=connections) if connections > 1 else None
+        )
 
-                while not open.empty():
+        self._set_phase(LibraryIndexingPhase.crawling)
 
-                    if QThread.currentThread().isInterruptionRequested():
-                        raise ThreadStoppedError()
+        try:
 
-                    next: Node = open.get()
+            queue.append(tree)
 
-                    next_path: str = next.getPath()
+            while queue or pending:
 
-                    dir_list: List[str] = f.listdir(next_path)
+                self._cancellation.check()
 
-                    for dir in dir_list:
+                if (
+                    journal
+                    and time.monotonic() - checkpoint_time >= CHECKPOINT_INTERVAL
+                ):
+                    append = self._save_checkpoint(lib, journal, append) or append
+                    checkpoint_time = time.monotonic()
 
-                        node_count += 1
-                        scan = True
-                        self.application.processEvents()  # type: ignore
+                if pool is None:
 
-                        new: Node = Node()
-                        new.setName(dir)
+                    next = queue.popleft()
+                    path = next.getPath()
 
-                        if f.isdir(next_path + "/" + dir):
-                            new.setDirectory()
-                            new.setModificationTime(
-                                f.getmodified(next_path + "/" + dir)
-                                or (datetime.fromtimestamp(0, timezone.utc))
-                            )
-                        else:
-                            new.setFile()
+                    if path in cached:
+                        entries = cached.pop(path)
+                    else:
+                        entries = self._list_directory(lib, path)
+                        journal.append((path, entries))
 
-                        if new.isFile():
+                    self._add_listing(old_tree, next, entries, rescanned, queue)
 
-                            # check file extensions
-                            _, ext = posixpath.splitext(new.getName())
+                    self._progress.pending = len(queue)
+                    self._publish_progress()
 
-                            if not ext.lower() in getSupportedFileExtensions():
-                                del new
-                                continue
+                    continue
 
-                            scan = False
+                while queue and len(pending) < connections:
 
-                        if new.isDirectory():
+                    next = queue.popleft()
+                    path = next.getPath()
 
-                            existing_node = old_tree.findChild(next_path + "/" + dir)
+                    if path in cached:
+                        self._add_listing(
+                            old_tree, next, cached.pop(path), rescanned, queue
+                        )
+                    else:
+                        pending[pool.submit(self._list_directory, lib, path)] = next
 
-                        if (
-                            new.isFile()  # files need to be added no matter what
-                            or (
-                                existing_node
-                                and new.getModificationTime()
-                                > existing_node.getModificationTime()  # only scan directories if modified lately
-                            )
-                            or not existing_node  # or if they didn't exist earlier
-                        ):
+                if not pending:
+                    continue
 
-                            next.addChild(new)
+                done, _ = wait(pending.keys(), timeout=0.1, return_when=FIRST_COMPLETED)
 
-                        else:
+                for future in done:
 
-                            next.addChild(existing_node)
-                            scan = False
+                    next = pending.pop(future)
+                    entries = future.result()
 
-                        if scan:
-                            open.put(new)
+                    journal.append((next.getPath(), entries))
 
-                        self.status.emit(
-                            self.library, f"{node_count} new nodes indexed."
-                        )
+                    self._add_listing(old_tree, next, entries, rescanned, queue)
+
+                    self._progress.pending = len(pending) + len(queue)
+                    self._publish_progress()
 
         except fs.errors.CreateFailed:
             return None
 
+        # the next crawl of the library will resume from here
+        except (fs.errors.FSError, ThreadStoppedError):
+            self._save_checkpoint(lib, journal, append)
+            raise
+
+        finally:
+
+            for future in pending:
+                future.cancel()
+
+            if pool:
+                pool.shutdown(wait=True)
+
+        removeCheckpoint(lib)
+
         return tree
 
-    def indexBooks(self, lib: Library, tree: Node) -> List[Book]:
+    # every listing borrows its own connection from the pool
+    # since most remote filesystems cannot handle several requests
+    # on the same connection at once
+
+    def _list_directory(self, lib: Library, path: str) -> List[DirectoryEntry]:
+
+        entries: List[DirectoryEntry] = []
+        info: Info
+
+        with self.connection_pool.connection(lib.getPath()) as f:
+
+            # the details namespace delivers type, size and modification time
+            # for the whole directory at once (e.g. MLSD on FTP)
+            # instead of querying every single entry afterwards
+            for info in f.scandir(path, namespaces=["details"]):
 
-        book_map: Dict[Book, Node] = {}
-        book: Book
-        i: int
+                entries.append(
+                    DirectoryEntry(
+                        name=info.name,
+                        directory=info.is_dir,
+                        size=info.size if info.has_namespace("details") else -1,
+                        modification_time=info.modified
+                        or datetime.fromtimestamp(0, timezone.utc),
+                    )
+                )
+
+        return entries
+
+    # builds a new version of the tree of lib in which only the directories
+    # given as paths are listed again, along with their subdirectories that
+    # changed since, like indexFolderStructure() would do
+    # all other directories are shared with the current tree, directories
+    # on the way to the listed ones are copied without listing them
+    # the paths of all listed directories and their ancestors will be added
+    # to rescanned, since books containing them might have changed as well
+
+    def updateFolderStructure(
+        self, lib: Library, paths: Set[str], rescanned: Set[str]
+    ) -> Node:
+
+        ancestors: Set[str] = set()
+        child: Node
+        copy: Node
+        existing_node: Optional[Node]
+        listed: Set[str] = set()
+        modification_time: Optional[datetime]
+        new: Node
+        next: Node
+        node: Node
+        old_tree: Node = lib.getTree()
+        parent: str
+        path: str
+        queue: Deque[Node] = deque()
+        stack: List[Tuple[Node, Node]]
+        tree: Node = Node()
+
+        # directories within other listed directories are covered by those,
+        # parents come first
+        for path in sorted(paths, key=lambda p: -1 if p == "" else p.count("/")):
+
+            parent = path
+
+            while parent != "" and parent not in listed:
+                parent = posixpath.dirname(parent)
+
+            if parent in listed:
+                continue
+
+            existing_node = old_tree if path == "" else old_tree.findChild(path)
+
+            if existing_node is None or not existing_node.isDirectory():
+                continue
+
+            listed.add(path)
+
+            parent = path
+
+            while parent != "":
+                parent = posixpath.dirname(parent)
+                ancestors.add(parent)
+
+        tree.setDirectory()
+        tree.setModificationTime(old_tree.getModificationTime())
+
+        if "" in listed:
+            queue.append(tree)
+
+        stack = [(old_tree, tree)] if "" in ancestors else []
+
+        while stack:
+
+            node, copy = stack.pop()
+
+            for child in node.getChildren():
+
+                path = child.getPath()
+
+                if path in ancestors or path in listed:
+
+                    new = Node(child.getName())
+                    new.setDirectory()
+                    new.setModificationTime(child.getModificationTime())
+                    copy.addChild(new)
+
+                    if path in listed:
+                        queue.append(new)
+                    else:
+                        stack.append((child, new))
+
+                else:
+                    copy.addSharedChild(child)
+
+        while queue:
+
+            self._cancellation.check()
+
+            next = queue.popleft()
+            path = next.getPath()
+
+            try:
+
+                with self.connection_pool.connection(lib.getPath()) as f:
+                    modification_time = f.getinfo(
+                        path or "/", namespaces=["details"]
+                    ).modified
+
+                self._add_listing(
+                    old_tree, next, self._list_directory(lib, path), rescanned, queue
+                )
+
+            except fs.errors.ResourceNotFound:
+
+                # the library itself is gone, which isn't a change to apply
+                if next is tree:
+                    raise
+
+                # the directory was removed meanwhile
+                cast(Node, next.getParent()).removeChild(next)
+                continue
+
+            if modification_time:
+                next.setModificationTime(modification_time)
+
+        rescanned.update(ancestors)
+
+        return tree
+
+    # adds a finished directory listing to the tree
+    # and queues all directories found which need to be listed as well
+
+    def _add_listing(
+        self,
+        old_tree: Node,
+        parent: Node,
+        entries: List[DirectoryEntry],
+        rescanned: Set[str],
+        queue: Deque[Node],
+    ) -> None:
+
+        queue.extend(self._add_entries(old_tree, parent, entries))
+        rescanned.add(parent.getPath())
+
+        self._progress.directories += 1
+        self._found_files = parent.getRoot().getFileCount()
+
+    # turns the entries of a directory listing into children of parent
+    # directories which didn't change since the last run will be shared
+    # with the old tree, all others are returned since they need to be listed
+    # the old tree is still in use and must not be modified,
+    # the new one will take over the shared directories once it replaced it,
+    # or becomes a columnar tree itself if it shares those of a columnar tree
+
+    def _add_entries(
+        self, old_tree: Node, parent: Node, entries: List[DirectoryEntry]
+    ) -> List[Node]:
+
+        entry: DirectoryEntry
+        existing_node: Optional[Node] = None
+        parent_path: str = parent.getPath()
+        scan: bool
+        to_scan: List[Node] = []
+
+        for entry in entries:
+
+            scan = True
+            self._cancellation.tick()
+
+            new: Node = Node()
+            new.setName(entry.name)
+
+            if entry.directory:
+                new.setDirectory()
+            else:
+                new.setFile()
+                new.setSize(entry.size)
+
+            new.setModificationTime(entry.modification_time)
+
+            if new.isFile():
+
+                # check file extensions
+                _, ext = posixpath.splitext(new.getName())
+
+                if not ext.lower() in getSupportedFileExtensions():
+                    del new
+                    continue
+
+                scan = False
+
+                self._progress.files += 1
+                self._progress.bytes += max(entry.size, 0)
+
+            if new.isDirectory():
+
+                existing_node = old_tree.findChild(parent_path + "/" + entry.name)
+
+            if (
+                new.isFile()  # files need to be added no matter what
+                or (
+                    existing_node
+                    and new.getModificationTime()
+                    > existing_node.getModificationTime()  # only scan directories if modified lately
+                )
+                or not existing_node  # or if they didn't exist earlier
+            ):
+
+                parent.addChild(new)
+
+            else:
+
+                parent.addSharedChild(existing_node)
+
+                scan = False
+
+            if scan:
+                to_scan.append(new)
+
+        return to_scan
+
+    # writes all listings of the journal to the checkpoint and empties it
+    # returns whether that worked out
+
+    def _save_checkpoint(
+        self,
+        lib: Library,
+        journal: List[Tuple[str, List[DirectoryEntry]]],
+        append: bool,
+    ) -> bool:
+
+        try:
+            saveCheckpoint(lib, journal, append)
+        except OSError:
+            warnings.warn(f"unable to write indexing checkpoint for {lib.getName()}")
+            return False
+
+        journal.clear()
+
+        return True
+
+    # if rescanned is given, only directories which were rescanned
+    # by indexFolderStructure will be matched against the patterns again
+    # all other directories keep the books (and their tags) they had before
+    # books that still exist after a rescan will keep their identity as well
+
+    def indexBooks(
+        self, lib: Library, tree: Node, rescanned: Optional[Set[str]] = None
+    ) -> List[Book]:
+
+        book: Optional[Book]
+        book_map: Dict[str, Book] = {}
+        book_nodes: Dict[str, Node] = {}
+        depth: int
         match: Optional[TagCollection]
         next: Node
+        next_path: str
         pattern: Pattern[str]
+        patterns: Dict[int, List[Pattern[str]]] = {}
 
         for pattern in Patterns:
+            patterns.setdefault(getPatternDepth(pattern), []).append(pattern)
 
-            for next in tree.iterChildren(depth=getPatternDepth(pattern), files=False):
+        self._set_phase(LibraryIndexingPhase.matching)
 
-                if next in book_map.values():
-                    warnings.warn(
-                        "path was matched multiple times, will use first match only"
-                    )
-                    continue
+        # a single pass over the tree, no deeper than books can be found
+        for next, depth in tree.walk(max_depth=max(patterns.keys())):
 
-                self.application.processEvents()  # type: ignore
+            if not next.isDirectory() or depth not in patterns:
+                continue
 
-                match = matchPattern(pattern, next.getPath())
+            self._cancellation.tick()
 
-                if match:
-                    book = Book(next.getPath(), match)
+            next_path = next.getPath()
+            book = None
 
-                    book_map[book] = next
+            if rescanned is not None and next_path not in rescanned:
 
-        # iterate over all books in the dict
-        # if the book is already part of the tree of another book, remove it
-        # this might happen whenever a path is detected as a book
-        # although e.g. their subpaths were also recognized as books already
+                # the whole subtree is unchanged since the last run
+                book = lib.findBook(next_path)
 
-        books: List[Book] = list(book_map.keys())
-        book_nodes: List[Node] = list(book_map.values())
-        i = 0
-        j: int = 0
+            else:
 
-        while i < len(book_map):
+                # earlier patterns take precedence over later ones
+                for pattern in patterns[depth]:
 
-            for j in range(len(book_map)):
+                    match = matchPattern(pattern, next_path)
 
-                if QThread.currentThread().isInterruptionRequested():
-                    raise ThreadStoppedError()
+                    if match:
+                        book = lib.findBook(next_path) or Book(next_path, match)
+                        break
 
-                if i == j:
-                    continue
+            if book:
+                book_map[next_path] = book
+                book_nodes[next_path] = next
+                self._progress.books += 1
 
-                self.application.processEvents()  # type: ignore
+            self._publish_progress()
 
-                if book_nodes[i].isParentOf(book_nodes[j]):
-                    del book_map[books[i]]
-                    del books[i]
-                    del book_nodes[i]
-                    break
+        books: List[Book] = [
+            book_map[path] for path in self.removeNestedBooks(book_nodes).keys()
+        ]
 
-            else:
-                i += 1
+        self._progress.books = len(books)
 
         return books
+
+    # if a book is already part of the tree of another book, remove the outer one
+    # this might happen whenever a path is detected as a book
+    # although e.g. their subpaths were also recognized as books already
+    # all ancestor paths of a book get marked, and walking up stops as soon as
+    # an already marked path is reached, so every directory is visited at most once
+    # paths are used instead of the nodes themselves, since nodes of columnar
+    # trees are views which get created anew whenever they're accessed
+
+    def removeNestedBooks(self, book_nodes: Dict[str, Node]) -> Dict[str, Node]:
+
+        ancestors: Set[str] = set()
+        parent: str
+        path: str
+
+        for path in book_nodes.keys():
+
+            self._cancellation.tick()
+
+            parent = posixpath.dirname(path)
+
+            while parent != "" and parent not in ancestors:
+                ancestors.add(parent)
+                parent = posixpath.dirname(parent)
+
+        return {
+            path: node for path, node in book_nodes.items() if path not in ancestors
+        }
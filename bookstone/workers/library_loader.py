@@ -0,0 +1,101 @@
+import os.path
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QApplication
+
+from exceptions import ThreadStoppedError
+from library.library import Library
+from library.library_files import isLegacyLibraryFile, readLibraryFile
+
+from .cancellation_token import CancellationToken
+
+# amount of library files read at the same time
+LOADING_THREADS: int = 4
+
+
+def _get_size(file_name: str) -> int:
+
+    try:
+        return os.path.getsize(file_name)
+    except OSError:
+        return 0
+
+
+# reads library files on a pool of threads
+# every library is sent via loaded as soon as it was read, together with
+# whether it was read from a legacy file and needs to be migrated
+# smaller files are read first, so that something shows up quickly
+# only reading the files themselves happens in parallel, decoding the books
+# is still limited by the interpreter lock
+
+
+class LibraryLoaderWorker(QObject):
+
+    application: QApplication
+    file_names: List[str]
+    finished: pyqtSignal = pyqtSignal()
+    loaded: pyqtSignal = pyqtSignal(Library, bool)
+
+    _cancellation: CancellationToken
+
+    def __init__(self, application: QApplication, file_names: List[str]) -> None:
+
+        super().__init__()
+
+        self.application = application
+        self.file_names = file_names
+        self._cancellation = CancellationToken()
+
+    # may be called from any thread
+    def cancel(self) -> None:
+        self._cancellation.cancel()
+
+    @pyqtSlot()
+    def run(self) -> None:
+
+        file_name: str
+        future: "Future[Library]"
+        lib: Library
+        pending: Dict["Future[Library]", str] = {}
+        pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=LOADING_THREADS)
+
+        try:
+
+            for file_name in sorted(self.file_names, key=_get_size):
+                pending[pool.submit(readLibraryFile, file_name)] = file_name
+
+            while pending:
+
+                self._cancellation.check()
+
+                done, _ = wait(pending.keys(), timeout=0.1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+
+                    file_name = pending.pop(future)
+
+                    try:
+                        lib = future.result()
+                    except (OSError, ValueError) as exc:
+                        warnings.warn(
+                            f"invalid library file {os.path.basename(file_name)}: "
+                            f"{exc}"
+                        )
+                        continue
+
+                    self.loaded.emit(lib, isLegacyLibraryFile(file_name))
+
+            self.finished.emit()
+
+        except ThreadStoppedError:
+            pass
+
+        finally:
+
+            for future in pending:
+                future.cancel()
+
+            pool.shutdown(wait=True)
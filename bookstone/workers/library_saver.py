@@ -1,15 +1,19 @@
-import json
-from typing import IO, Any, Dict
+import os
+import os.path
+import sqlite3
+import warnings
 
-import fs
-import fs.move
-import fs.osfs
-from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import QApplication
 
-from library.library import Library
+from exceptions import ThreadStoppedError
+from library import sqlite_storage
+from library.binary_storage import writeLibrary
+from library.library import Library, LibraryChanges, LibraryStorage
 from utils import getLibrariesDirectory
 
+from .cancellation_token import CancellationToken
+
 
 class LibrarySaverWorker(QObject):
 
@@ -17,48 +21,91 @@ class LibrarySaverWorker(QObject):
     finished: pyqtSignal = pyqtSignal()
     library: Library
 
+    _cancellation: CancellationToken
+
     def __init__(self, application: QApplication, library: Library) -> None:
 
         super().__init__()
 
         self.application = application
         self.library = library
+        self._cancellation = CancellationToken()
 
-    @pyqtSlot()
-    def run(self) -> None:
-
-        ser: Dict[str, Any] = self.library.serialize()
-        data: str = json.dumps(ser, indent=2)
-
-        with fs.open_fs("temp://bookstone") as temp_fs:
-
-            temp_file: IO[str] = temp_fs.open(f"{self.library.uuid}.json", mode="w")
-
-            chunk_size: int = 1024 * 1024
-            offset: int = 0
+    # may be called from any thread
+    def cancel(self) -> None:
+        self._cancellation.cancel()
 
-            while offset < len(data):
+    # binary libraries are written next to their file first and replace it
+    # afterwards, so that there is always a complete library file on disk
+    # the file must never be written in place, since it might be memory-mapped
+    # by the library currently in use
+    # databases are updated in place instead, only writing what changed
+    # both are written bit by bit, checking for cancellation in between
+    # changes which couldn't be saved are handed back to the library
 
-                if QThread.currentThread().isInterruptionRequested():
-                    return
+    # finished is always emitted, since the manager only ever starts
+    # another save of the library afterwards
+    # failed saves keep their changes, they will be saved along with the next
 
-                self.application.processEvents()  # type: ignore
-
-                temp_file.write(data[offset : offset + chunk_size])
-
-                offset += chunk_size
-
-            temp_file.close()
-
-            local_fs: fs.osfs.OSFS = fs.osfs.OSFS(getLibrariesDirectory(), create=True)
-
-            fs.move.move_file(
-                temp_fs,
-                f"{self.library.uuid}.json",
-                local_fs,
-                f"{self.library.uuid}.json",
-            )
-
-            local_fs.close()
+    @pyqtSlot()
+    def run(self) -> None:
 
-        self.finished.emit()
+        try:
+            self._save()
+        finally:
+            self.finished.emit()
+
+    def _save(self) -> None:
+
+        changes: LibraryChanges
+        file_name: str = self.library.getFileName()
+        other_file_name: str
+
+        if self._cancellation.isCancelled():
+            return
+
+        changes = self.library.takeChanges()
+
+        try:
+
+            os.makedirs(getLibrariesDirectory(), exist_ok=True)
+
+            if self.library.getStorage() == LibraryStorage.database:
+                sqlite_storage.writeLibrary(
+                    self.library, file_name, changes, self._cancellation.check
+                )
+            else:
+                self._write_binary(file_name)
+
+        except ThreadStoppedError:
+            self.library.restoreChanges(changes)
+            return
+        except (OSError, sqlite3.Error) as exc:
+            self.library.restoreChanges(changes)
+            warnings.warn(f"unable to save {self.library.getName()}: {exc}")
+            return
+        except BaseException:
+            self.library.restoreChanges(changes)
+            raise
+
+        # libraries loaded from JSON files are migrated by saving them once,
+        # and libraries might have been stored differently before
+        for other_file_name in self.library.getAllFileNames():
+            if not other_file_name.startswith(file_name) and os.path.exists(
+                other_file_name
+            ):
+                os.remove(other_file_name)
+
+    def _write_binary(self, file_name: str) -> None:
+
+        temp_file_name: str = file_name + ".tmp"
+
+        try:
+            with open(temp_file_name, "wb") as f:
+                writeLibrary(self.library, f, check=self._cancellation.check)
+        except BaseException:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+
+        os.replace(temp_file_name, file_name)